@@ -0,0 +1,120 @@
+"""Benchmark cold start worker: waktu dari proses Python baru sampai response pertama.
+
+Setiap run menjalankan interpreter baru (seperti Passenger men-spawn worker), mengimpor entry WSGI,
+lalu mengirim satu request lewat Flask test client. Dicetak median dan maksimum dari:
+waktu import, waktu sampai response pertama, dan total umur proses (termasuk start interpreter).
+
+Run dianggap gagal (exit 1) jika modul berat (default: torch, ultralytics, onnxruntime, numpy) terimpor
+sebelum response pertama, atau jika median waktu sampai response pertama melebihi --max-ms. Dengan
+begitu script ini bisa dipasang di CI untuk menangkap regresi import.
+
+    python Benchmark/cold_start_benchmark.py
+    python Benchmark/cold_start_benchmark.py --runs 10 --max-ms 1500
+    python Benchmark/cold_start_benchmark.py --entry app --method GET --path /metrics --importtime 15
+
+Dengan --entry passenger_wsgi (default) init_db ikut berjalan, jadi tanpa MySQL yang bisa dihubungi
+waktunya termasuk koneksi yang gagal.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from time import perf_counter
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Dijalankan di proses anak; waktu diukur dari baris pertama script, setelah interpreter siap
+CHILD_SCRIPT = """
+import json, sys
+from time import perf_counter
+start = perf_counter()
+sys.path.insert(0, {root!r})
+entry = __import__({entry!r})
+imported = perf_counter()
+client = entry.application.test_client()
+response = client.open({path!r}, method={method!r}, json={body})
+done = perf_counter()
+print(json.dumps({{
+    "import_ms": (imported - start) * 1000,
+    "first_response_ms": (done - start) * 1000,
+    "status": response.status_code,
+    "heavy_modules": [m for m in {forbid!r} if m in sys.modules]
+}}))
+"""
+
+
+def run_once(args):
+    script = CHILD_SCRIPT.format(root=ROOT_DIR, entry=args.entry, path=args.path, method=args.method,
+                                 body=args.json or "None", forbid=args.forbid)
+    env = dict(os.environ, PRELOAD_MODEL="0", SCHEDULER_ENABLED="0", PIPELINE_MODE="0")
+    t0 = perf_counter()
+    proc = subprocess.run([sys.executable, "-c", script], cwd=ROOT_DIR, env=env, capture_output=True, text=True)
+    process_ms = (perf_counter() - t0) * 1000
+    if proc.returncode != 0:
+        raise RuntimeError(f"Proses anak gagal:\n{proc.stderr}")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result["process_ms"] = process_ms
+    return result
+
+
+def slowest_imports(args, top):
+    """Paket dengan waktu import kumulatif terbesar (python -X importtime) untuk entry yang sama."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {args.entry}"],
+                          cwd=ROOT_DIR, env=dict(os.environ, PRELOAD_MODEL="0", SCHEDULER_ENABLED="0"),
+                          capture_output=True, text=True)
+    # Per paket level atas diambil nilai kumulatif terbesar (= import terluarnya), supaya submodul
+    # tidak dihitung ganda; entry dan app sendiri dilewati karena mencakup semuanya
+    per_package = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        package = name.strip().split(".")[0]
+        if package in (args.entry, "app", "site"):
+            continue
+        per_package[package] = max(per_package.get(package, 0), int(cumulative) / 1000)
+    return sorted(((ms, name) for name, ms in per_package.items()), reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--entry", default="passenger_wsgi", help="modul yang diimpor: passenger_wsgi atau app")
+    parser.add_argument("--method", default="POST")
+    parser.add_argument("--path", default="/filter-directories")
+    parser.add_argument("--json", default="{}", help="body JSON request (literal Python, mis. {} atau None)")
+    parser.add_argument("--forbid", default="torch,ultralytics,onnxruntime,numpy",
+                        help="modul yang tidak boleh terimpor sebelum response pertama")
+    parser.add_argument("--max-ms", type=float, default=0, help="batas median first_response_ms (0 = tanpa batas)")
+    parser.add_argument("--importtime", type=int, default=0, help="tampilkan N paket yang paling lambat diimpor")
+    args = parser.parse_args()
+    args.forbid = [m for m in args.forbid.split(",") if m]
+
+    results = [run_once(args) for _ in range(args.runs)]
+
+    print(f"{args.runs} run, entry {args.entry}, {args.method} {args.path} -> status {results[0]['status']}")
+    for key in ("import_ms", "first_response_ms", "process_ms"):
+        values = [r[key] for r in results]
+        print(f"  {key:<18} p50 {statistics.median(values):8.1f}   max {max(values):8.1f}")
+
+    if args.importtime:
+        print("Paket paling lambat diimpor (kumulatif):")
+        for ms, name in slowest_imports(args, args.importtime):
+            print(f"  {ms:8.1f} ms  {name}")
+
+    failed = False
+    heavy = sorted({m for r in results for m in r["heavy_modules"]})
+    if heavy:
+        print(f"GAGAL: modul berat ikut terimpor sebelum response pertama: {', '.join(heavy)}")
+        failed = True
+    p50 = statistics.median(r["first_response_ms"] for r in results)
+    if args.max_ms and p50 > args.max_ms:
+        print(f"GAGAL: median first_response_ms {p50:.1f} > {args.max_ms:.1f}")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,468 @@
+"""Benchmark end-to-end endpoint app.py lewat Flask test client, tanpa MySQL dan tanpa bobot asli.
+
+Membuat folder kerja berisi Storage/ sintetis (hari x capture x crop, dengan layout crop_N.jpg +
+full.jpg seperti aslinya), database SQLite pengganti MySQL yang diisi baris chili_runs_v1 dan
+chili_predictions_v1 yang cocok dengan folder tersebut, lalu menembak endpoint secara bersamaan
+dan mencetak p50/p95/p99, throughput, dan puncak RSS per endpoint.
+
+Secara default memakai classifier stub (tanpa Model/best.pt), jadi bisa dijalankan offline.
+
+    python Benchmark/e2e_benchmark.py
+    python Benchmark/e2e_benchmark.py --days 60 --captures-per-day 2 --crops 22 --requests 500 --concurrency 16
+    python Benchmark/e2e_benchmark.py --endpoints get-data,search --image-mode url --json hasil.json
+    python Benchmark/e2e_benchmark.py --model real        # pakai Model/best.pt
+"""
+import argparse
+import io
+import json
+import os
+import random
+import re
+import resource
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date, datetime, time, timedelta
+from time import perf_counter
+
+from PIL import Image, ImageDraw
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+import app as api  # noqa: E402
+
+CLASS_LABELS = [str(i) for i in range(10)]
+ENDPOINTS = ["get-data", "search", "filter-directories", "classify"]
+
+# Skema SQLite yang setara dengan tabel MySQL yang dipakai endpoint di atas
+SQLITE_SCHEMA = """
+CREATE TABLE chili_runs_v1 (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    tanggal TEXT, waktu TEXT, folder TEXT UNIQUE, model_version TEXT,
+    jumlah_gambar INTEGER, duration REAL
+);
+CREATE TABLE chili_predictions_v1 (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    tanggal TEXT, waktu TEXT, image TEXT,
+    pred_class_1 TEXT, conf_1 REAL, pred_class_2 TEXT, conf_2 REAL, pred_class_3 TEXT, conf_3 REAL,
+    run_id INTEGER REFERENCES chili_runs_v1 (id) ON DELETE SET NULL
+);
+CREATE INDEX idx_pred_tanggal_waktu ON chili_predictions_v1 (tanggal, waktu);
+CREATE INDEX idx_pred_image ON chili_predictions_v1 (image);
+CREATE INDEX idx_pred_class_1 ON chili_predictions_v1 (pred_class_1);
+CREATE INDEX idx_pred_class_2 ON chili_predictions_v1 (pred_class_2);
+CREATE INDEX idx_pred_class_3 ON chili_predictions_v1 (pred_class_3);
+CREATE TABLE chili_stats_daily_v1 (
+    tanggal TEXT NOT NULL, pred_class TEXT NOT NULL, jumlah INTEGER NOT NULL, total_conf REAL NOT NULL,
+    PRIMARY KEY (tanggal, pred_class)
+);
+CREATE TABLE chili_stats_run_v1 (
+    run_id INTEGER NOT NULL, pred_class TEXT NOT NULL, jumlah INTEGER NOT NULL, total_conf REAL NOT NULL,
+    PRIMARY KEY (run_id, pred_class)
+);
+CREATE TABLE chili_image_cache_v1 (
+    sha256 TEXT NOT NULL, model_version TEXT NOT NULL,
+    pred_class_1 TEXT, conf_1 REAL, pred_class_2 TEXT, conf_2 REAL, pred_class_3 TEXT, conf_3 REAL,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (sha256, model_version)
+);
+"""
+
+
+# --- Database pengganti: SQLite dengan antarmuka kecil yang dipakai app.py dari mysql.connector ---
+
+def translate_sql(query):
+    # Dialek MySQL yang dipakai app.py -> SQLite
+    query = re.sub(r"MATCH \(([^)]*)\) AGAINST \(%s IN BOOLEAN MODE\)", r"bench_match(%s, \1)", query)
+    query = query.replace("INSERT IGNORE", "INSERT OR IGNORE")
+    query = query.replace("ON DUPLICATE KEY UPDATE", "ON CONFLICT DO UPDATE SET")
+    query = re.sub(r"VALUES\((\w+)\)", r"excluded.\1", query)
+    query = query.replace("FOR UPDATE", "")
+    return query.replace("%s", "?")
+
+
+def adapt_param(value):
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, timedelta):
+        seconds = int(value.total_seconds())
+        return f"{seconds // 3600:02}:{seconds % 3600 // 60:02}:{seconds % 60:02}"
+    return value
+
+
+def bench_match(terms, *columns):
+    # Pengganti MATCH ... AGAINST (IN BOOLEAN MODE) untuk term "+kata*": setiap kata wajib
+    # menjadi prefix dari salah satu token kolom
+    tokens = [t.lower() for column in columns if column for t in re.split(r"\W+", str(column)) if t]
+    for term in terms.split():
+        word = term.strip('+-*"').lower()
+        if word and not any(token.startswith(word) for token in tokens):
+            return 0
+    return 1
+
+
+class SqliteCursor:
+    def __init__(self, conn, dictionary=False):
+        self._cursor = conn.cursor()
+        self._dictionary = dictionary
+
+    def execute(self, query, params=()):
+        self._cursor.execute(translate_sql(query), [adapt_param(p) for p in params or ()])
+
+    def executemany(self, query, seq):
+        self._cursor.executemany(translate_sql(query), [[adapt_param(p) for p in row] for row in seq])
+
+    def _row(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return {column[0]: value for column, value in zip(self._cursor.description, row)}
+
+    def fetchone(self):
+        return self._row(self._cursor.fetchone())
+
+    def fetchall(self):
+        return [self._row(row) for row in self._cursor.fetchall()]
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def close(self):
+        self._cursor.close()
+
+
+class SqliteConnection:
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.create_function("bench_match", -1, bench_match, deterministic=True)
+
+    def cursor(self, dictionary=False, **kwargs):
+        return SqliteCursor(self._conn, dictionary)
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        self._conn.close()
+
+
+def make_get_db(db_path):
+    local = threading.local()
+
+    @contextmanager
+    def get_db():
+        # Satu koneksi per thread, seperti koneksi pool yang dipinjam per request
+        if getattr(local, "conn", None) is None:
+            local.conn = SqliteConnection(db_path)
+        yield local.conn
+
+    return get_db
+
+
+# --- Classifier stub: tanpa torch/bobot, top-3 deterministik dari isi gambar ---
+
+class StubModel:
+    def __init__(self, imgsz=224):
+        self.model = type("StubNet", (), {"names": dict(enumerate(CLASS_LABELS)), "args": {"imgsz": imgsz}})()
+
+
+def stub_predict_top3_batch(model, images):
+    top3_batch = []
+    for img in images:
+        seed = sum(img.resize((8, 8)).convert("L").tobytes())
+        rng = random.Random(seed)
+        classes = rng.sample(CLASS_LABELS, 3)
+        first = rng.uniform(0.5, 0.99)
+        second = rng.uniform(0, 1 - first)
+        top3_batch.append((classes, [first, second, rng.uniform(0, 1 - first - second)]))
+    return top3_batch
+
+
+# --- Data sintetis ---
+
+def make_jpeg(rng, size):
+    img = Image.new("RGB", (size, size), tuple(rng.randrange(256) for _ in range(3)))
+    draw = ImageDraw.Draw(img)
+    for _ in range(6):
+        x, y = rng.randrange(size), rng.randrange(size)
+        draw.ellipse((x, y, x + size // 4, y + size // 4), fill=tuple(rng.randrange(256) for _ in range(3)))
+    buffer = io.BytesIO()
+    img.save(buffer, "JPEG", quality=85)
+    return buffer.getvalue()
+
+
+def build_storage(workdir, db_path, args, rng):
+    """Isi Storage/ dan database dengan capture sintetis. Mengembalikan daftar folder."""
+    storage_dir = os.path.join(workdir, "Storage")
+    os.makedirs(storage_dir)
+
+    # Sekumpulan kecil gambar dipakai berulang supaya pembuatan tree tetap cepat
+    crop_pool = [make_jpeg(rng, args.crop_size) for _ in range(32)]
+    full_image = make_jpeg(rng, args.crop_size * 4)
+
+    conn = sqlite3.connect(db_path)
+    conn.executescript(SQLITE_SCHEMA)
+    folders = []
+    start_day = date.today() - timedelta(days=args.days)
+    for day_offset in range(args.days):
+        day = start_day + timedelta(days=day_offset)
+        for capture in range(args.captures_per_day):
+            moment = datetime.combine(day, time(8)) + timedelta(hours=12 * capture, seconds=rng.randrange(60))
+            folder = moment.strftime("%Y-%m-%d_%H-%M-%S")
+            folder_path = os.path.join(storage_dir, folder)
+            os.makedirs(folder_path)
+            with open(os.path.join(folder_path, "full.jpg"), "wb") as f:
+                f.write(full_image)
+
+            cursor = conn.execute(
+                "INSERT INTO chili_runs_v1 (tanggal, waktu, folder, model_version, jumlah_gambar, duration) "
+                "VALUES (?, ?, ?, 'stub', ?, 0)",
+                (moment.strftime("%Y-%m-%d"), moment.strftime("%H:%M:%S"), folder, args.crops)
+            )
+            run_id = cursor.lastrowid
+            rows = []
+            for n in range(1, args.crops + 1):
+                image = f"crop_{n}.jpg"
+                with open(os.path.join(folder_path, image), "wb") as f:
+                    f.write(rng.choice(crop_pool))
+                classes = rng.sample(CLASS_LABELS, 3)
+                rows.append((moment.strftime("%Y-%m-%d"), moment.strftime("%H:%M:%S"), image,
+                             classes[0], rng.random(), classes[1], rng.random(), classes[2], rng.random(), run_id))
+            conn.executemany(
+                "INSERT INTO chili_predictions_v1 (tanggal, waktu, image, pred_class_1, conf_1, pred_class_2, conf_2, "
+                "pred_class_3, conf_3, run_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+            )
+            folders.append(folder)
+    conn.commit()
+    conn.close()
+    return folders
+
+
+def prepare_captures(count, args, rng):
+    # Capture baru di Staging dengan crop unik (supaya tidak semua kena cache hasil per hash)
+    capture_ids = []
+    for _ in range(count):
+        capture_id = os.urandom(16).hex()
+        capture_dir = os.path.join(api.STAGING_DIR, capture_id)
+        os.makedirs(capture_dir)
+        for n in range(1, args.crops + 1):
+            with open(os.path.join(capture_dir, f"crop_{n}.jpg"), "wb") as f:
+                f.write(make_jpeg(rng, args.crop_size))
+        capture_ids.append(capture_id)
+    return capture_ids
+
+
+# --- Beban dan pengukuran ---
+
+def read_rss():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except FileNotFoundError:
+        pass
+    # Bukan Linux: hanya puncak seumur proses yang tersedia
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class RssSampler:
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, read_rss())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = read_rss()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, read_rss())
+
+
+def make_requests(endpoint, count, folders, capture_ids, args, rng):
+    """Daftar (method, url, json) yang bervariasi supaya tidak hanya mengukur satu baris."""
+    days = sorted({folder[:10] for folder in folders})
+    image_mode = f"image_mode={args.image_mode}" + (f"&size={args.size}" if args.size else "")
+    requests = []
+    for i in range(count):
+        if endpoint == "get-data":
+            body = {"limit": args.page_size}
+            if rng.random() < 0.8:
+                folder = rng.choice(folders)
+                body.update({"tanggal": folder[:10], "waktu": folder[11:].replace("-", ":")})
+            requests.append(("POST", f"/get-data?{image_mode}", body))
+        elif endpoint == "search":
+            day = rng.choice(days)
+            q = rng.choice([day, day[:7], f"tanggal={day}", f"crop_{rng.randint(1, args.crops)}",
+                            rng.choice(CLASS_LABELS), f"pred_class_1={rng.choice(CLASS_LABELS)}", "08:00"])
+            requests.append(("GET", f"/search?q={q}&limit={args.page_size}", None))
+        elif endpoint == "filter-directories":
+            day = rng.choice(days)
+            body = rng.choice([{}, {"tanggal": day}, {"tahun": int(day[:4]), "bulan": int(day[5:7])},
+                               {"tahun": int(day[:4]), "bulan": int(day[5:7]), "minggu": rng.randint(1, 4)}])
+            requests.append(("POST", "/filter-directories", body))
+        elif endpoint == "classify":
+            requests.append(("GET", f"/classify?capture_id={capture_ids[i]}", None))
+    return requests
+
+
+def run_load(requests, concurrency):
+    local = threading.local()
+
+    def send(request):
+        if getattr(local, "client", None) is None:
+            local.client = api.app.test_client()
+        method, url, body = request
+        start = perf_counter()
+        response = local.client.open(url, method=method, json=body)
+        response.get_data()
+        return perf_counter() - start, response.status_code
+
+    start = perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(send, requests))
+    return results, perf_counter() - start
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    k = (len(ordered) - 1) * pct / 100
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def summarize(endpoint, results, wall, peak_rss):
+    latencies = [latency * 1000 for latency, _ in results]
+    errors = sum(1 for _, status in results if status >= 400)
+    return {
+        "endpoint": endpoint,
+        "requests": len(results),
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "mean_ms": round(statistics.fmean(latencies), 2) if latencies else 0.0,
+        "throughput_rps": round(len(results) / wall, 2) if wall else 0.0,
+        "peak_rss_mb": round(peak_rss / 1024 / 1024, 1)
+    }
+
+
+def configure_app(workdir, db_path, args):
+    # Arahkan semua path app.py ke folder kerja dan ganti database/model dengan pengganti lokal
+    for name, sub in [("TEMP_DIR", "Temp"), ("STAGING_DIR", "Staging"), ("STORAGE_DIR", "Storage"),
+                      ("RESULTS_DIR", "Results"), ("THUMBNAIL_DIR", "Thumbnails"), ("CACHE_DIR", "Cache"),
+                      ("ARCHIVE_DIR", "Archive")]:
+        path = os.path.join(workdir, sub)
+        os.makedirs(path, exist_ok=True)
+        setattr(api, name, path)
+    api.CACHE_GENERATION_FILE = os.path.join(api.CACHE_DIR, "generation")
+    api.get_db = make_get_db(db_path)
+    api.CLASSIFY_WORKERS = args.classify_workers
+    if not args.result_cache:
+        api.RESULT_CACHE_TTL = 0
+
+    if args.model == "stub":
+        stub = StubModel(args.imgsz)
+        api.get_model = lambda: stub
+        api._model_signature = lambda: (0, 0)
+        api.predict_top3_batch = stub_predict_top3_batch
+
+
+def print_table(rows):
+    columns = ["endpoint", "requests", "errors", "p50_ms", "p95_ms", "p99_ms", "mean_ms", "throughput_rps", "peak_rss_mb"]
+    widths = [max(len(c), *(len(str(r[c])) for r in rows)) for c in columns]
+    print("  ".join(c.ljust(w) for c, w in zip(columns, widths)))
+    for row in rows:
+        print("  ".join(str(row[c]).ljust(w) for c, w in zip(columns, widths)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--captures-per-day", type=int, default=2)
+    parser.add_argument("--crops", type=int, default=22, help="crop per capture")
+    parser.add_argument("--crop-size", type=int, default=160, help="sisi crop sintetis (px)")
+    parser.add_argument("--requests", type=int, default=200, help="request per endpoint (kecuali classify)")
+    parser.add_argument("--classify-runs", type=int, default=4, help="jumlah capture yang diklasifikasi")
+    parser.add_argument("--classify-workers", type=int, default=2)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS))
+    parser.add_argument("--image-mode", choices=["base64", "url"], default="base64")
+    parser.add_argument("--size", type=int, default=None, help="ukuran thumbnail untuk /get-data")
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--result-cache", action="store_true", help="aktifkan cache hasil /get-data dan lainnya")
+    parser.add_argument("--model", choices=["stub", "real"], default="stub")
+    parser.add_argument("--imgsz", type=int, default=224, help="ukuran input classifier stub")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workdir", default=None, help="folder kerja (default: folder sementara)")
+    parser.add_argument("--keep", action="store_true", help="jangan hapus folder kerja")
+    parser.add_argument("--json", default=None, help="simpan hasil ke file JSON")
+    args = parser.parse_args()
+
+    endpoints = [e.strip() for e in args.endpoints.split(",") if e.strip()]
+    unknown = set(endpoints) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"Endpoint tidak dikenal: {', '.join(sorted(unknown))}")
+
+    rng = random.Random(args.seed)
+    workdir = args.workdir or tempfile.mkdtemp(prefix="smartfarm-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    db_path = os.path.join(workdir, "bench.sqlite3")
+
+    try:
+        start = perf_counter()
+        folders = build_storage(workdir, db_path, args, rng)
+        configure_app(workdir, db_path, args)
+        print(f"Storage sintetis: {len(folders)} capture x {args.crops} crop di {workdir} "
+              f"({perf_counter() - start:.1f} s)")
+
+        rows = []
+        for endpoint in endpoints:
+            count = args.classify_runs if endpoint == "classify" else args.requests
+            capture_ids = prepare_captures(count, args, rng) if endpoint == "classify" else []
+            requests = make_requests(endpoint, count, folders, capture_ids, args, rng)
+            with RssSampler() as sampler:
+                results, wall = run_load(requests, args.concurrency)
+            rows.append(summarize(endpoint, results, wall, sampler.peak))
+
+        print()
+        print_table(rows)
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump({"args": vars(args), "results": rows}, f, indent=4)
+    finally:
+        if not args.keep and not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Bandingkan backend torch dengan ONNX (fp32 dan int8) pada crop yang tersimpan di Storage/.
+
+Untuk setiap backend: median latensi per batch dan per gambar, lalu terhadap hasil torch:
+kecocokan top-1, overlap top-3, dan selisih rata-rata confidence top-1.
+
+    python export_onnx.py --int8
+    python Benchmark/onnx_benchmark.py --images 500 --threads 4
+    python Benchmark/onnx_benchmark.py --onnx Model/best.onnx --onnx Model/best.int8.onnx
+"""
+import argparse
+import os
+import statistics
+import sys
+from time import perf_counter
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+import torch  # noqa: E402
+from ultralytics import YOLO  # noqa: E402
+
+from app import (CLASSIFY_BATCH_SIZE, MODEL_PATH, STORAGE_DIR, OnnxClassifier,  # noqa: E402
+                 get_model_imgsz, is_crop_image, load_crop, predict_top3_batch)
+
+
+def collect_crops(limit):
+    paths = []
+    for folder in sorted(os.listdir(STORAGE_DIR), reverse=True):
+        folder_path = os.path.join(STORAGE_DIR, folder)
+        if not os.path.isdir(folder_path):
+            continue
+        for name in sorted(os.listdir(folder_path)):
+            if is_crop_image(name):
+                paths.append(os.path.join(folder_path, name))
+                if len(paths) >= limit:
+                    return paths
+    return paths
+
+
+def run_backend(model, images, batch_size, repeat):
+    # Batch pertama sebagai warm-up, tidak dihitung
+    predict_top3_batch(model, images[:batch_size])
+    latencies = []
+    results = []
+    for r in range(repeat):
+        for start in range(0, len(images), batch_size):
+            batch = images[start:start + batch_size]
+            t0 = perf_counter()
+            top3 = predict_top3_batch(model, batch)
+            latencies.append((perf_counter() - t0, len(batch)))
+            if r == 0:
+                results.extend(top3)
+    return results, latencies
+
+
+def compare(reference, results):
+    top1 = sum(1 for (ref_cls, _), (cls, _) in zip(reference, results) if ref_cls[0] == cls[0])
+    overlap = sum(len(set(ref_cls) & set(cls)) / 3 for (ref_cls, _), (cls, _) in zip(reference, results))
+    conf_diff = [abs(ref_conf[0] - conf[0]) for (_, ref_conf), (_, conf) in zip(reference, results)]
+    n = len(reference)
+    return {
+        "top1_agreement": round(top1 / n, 4),
+        "top3_overlap": round(overlap / n, 4),
+        "mean_top1_conf_diff": round(statistics.fmean(conf_diff), 5),
+        "max_top1_conf_diff": round(max(conf_diff), 5)
+    }
+
+
+def summarize(name, latencies):
+    per_batch = [t for t, _ in latencies]
+    per_image = [t / n for t, n in latencies]
+    total_images = sum(n for _, n in latencies)
+    return {
+        "backend": name,
+        "batch_p50_ms": round(statistics.median(per_batch) * 1000, 2),
+        "image_p50_ms": round(statistics.median(per_image) * 1000, 3),
+        "images_per_s": round(total_images / sum(per_batch), 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=200, help="jumlah crop dari Storage/")
+    parser.add_argument("--batch-size", type=int, default=CLASSIFY_BATCH_SIZE)
+    parser.add_argument("--threads", type=int, default=0, help="thread intra-op (0 = bawaan)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--onnx", action="append", default=None,
+                        help="file ONNX yang dibandingkan (default: Model/best.onnx dan Model/best.int8.onnx jika ada)")
+    args = parser.parse_args()
+
+    onnx_paths = args.onnx or [p for p in (os.path.join(ROOT_DIR, "Model", "best.onnx"),
+                                           os.path.join(ROOT_DIR, "Model", "best.int8.onnx")) if os.path.exists(p)]
+    if not onnx_paths:
+        parser.error("Tidak ada file ONNX. Jalankan python export_onnx.py terlebih dahulu.")
+
+    paths = collect_crops(args.images)
+    if not paths:
+        parser.error("Tidak ada crop di Storage/.")
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    torch_model = YOLO(MODEL_PATH)
+    imgsz = get_model_imgsz(torch_model)
+    images = [load_crop(path, imgsz) for path in paths]
+    print(f"{len(images)} crop, batch {args.batch_size}, imgsz {imgsz}, threads {args.threads or 'default'}")
+
+    reference, latencies = run_backend(torch_model, images, args.batch_size, args.repeat)
+    rows = [{**summarize("torch", latencies), "top1_agreement": 1.0, "top3_overlap": 1.0,
+             "mean_top1_conf_diff": 0.0, "max_top1_conf_diff": 0.0}]
+
+    for path in onnx_paths:
+        model = OnnxClassifier(path, args.threads)
+        results, latencies = run_backend(model, images, args.batch_size, args.repeat)
+        rows.append({**summarize(os.path.basename(path), latencies), **compare(reference, results)})
+
+    columns = list(rows[0])
+    widths = [max(len(c), *(len(str(r[c])) for r in rows)) for c in columns]
+    print("  ".join(c.ljust(w) for c, w in zip(columns, widths)))
+    for row in rows:
+        print("  ".join(str(row[c]).ljust(w) for c, w in zip(columns, widths)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""Benchmark /search: query OR-of-LIKE lama vs query planner baru (build_search_query).
+
+Membuat tabel chili_predictions_bench dengan skema dan index yang sama seperti
+chili_predictions_v1, mengisinya dengan baris sintetis, lalu untuk setiap input contoh
+mencetak hasil EXPLAIN dan waktu eksekusi kedua versi query.
+
+Memakai kredensial database dari .env yang sama dengan app.py.
+
+    python Benchmark/search_benchmark.py --rows 1000000
+    python Benchmark/search_benchmark.py --skip-seed      # pakai tabel yang sudah diisi
+    python Benchmark/search_benchmark.py --skip-seed --fulltext
+"""
+import argparse
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+from time import perf_counter
+
+import mysql.connector
+from dotenv import load_dotenv
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+load_dotenv(os.path.join(ROOT_DIR, ".env"))
+
+from app import (SCHEMA_STATEMENTS, SCHEMA_MIGRATIONS, FULLTEXT_MIGRATION, SEARCH_FIELDS,  # noqa: E402
+                 build_search_query)
+
+BENCH_TABLE = "chili_predictions_bench"
+CLASS_LABELS = [str(i) for i in range(10)]
+CROPS_PER_RUN = 22
+
+SAMPLE_QUERIES = [
+    "2025-05-15",
+    "2025-05",
+    "08:00",
+    "08:00:12",
+    "5",
+    "crop_12",
+    "crop_12.jpg",
+    "tanggal=2025-05-15",
+    "waktu=20:00",
+    "pred_class_1=1",
+    "image=crop_3",
+]
+
+
+def connect():
+    return mysql.connector.connect(
+        host=os.getenv("DB_HOST"),
+        user=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASS"),
+        database=os.getenv("DB_NAME")
+    )
+
+
+def seed(db, rows, batch_size=5000):
+    cursor = db.cursor()
+    cursor.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+    cursor.execute(SCHEMA_STATEMENTS[0].replace("chili_predictions_v1", BENCH_TABLE))
+
+    # Satu run tiap 30 menit dengan 22 crop, mirip hasil capture chamber
+    start = datetime(2024, 1, 1, 8, 0, 0)
+    batch = []
+    for i in range(rows):
+        ts = start + timedelta(minutes=30 * (i // CROPS_PER_RUN), seconds=random.randint(0, 59))
+        classes = random.sample(CLASS_LABELS, 3)
+        confs = sorted((random.random() for _ in range(3)), reverse=True)
+        batch.append((
+            ts.date(), ts.time(), f"crop_{i % CROPS_PER_RUN + 1}.jpg",
+            classes[0], confs[0], classes[1], confs[1], classes[2], confs[2]
+        ))
+        if len(batch) == batch_size:
+            _insert(cursor, batch)
+            db.commit()
+            batch = []
+    if batch:
+        _insert(cursor, batch)
+        db.commit()
+
+    # Index dibuat setelah data masuk supaya seeding lebih cepat. Index FULLTEXT selalu ikut dibuat
+    # (terlepas dari SEARCH_FULLTEXT) supaya --fulltext bisa dibandingkan pada tabel yang sama
+    for kind, table, _, statement in SCHEMA_MIGRATIONS + [FULLTEXT_MIGRATION]:
+        if kind == "index" and table == "chili_predictions_v1":
+            cursor.execute(statement.replace("chili_predictions_v1", BENCH_TABLE))
+    cursor.execute(f"ANALYZE TABLE {BENCH_TABLE}")
+    cursor.fetchall()
+    cursor.close()
+
+
+def _insert(cursor, batch):
+    cursor.executemany(f"""
+        INSERT INTO {BENCH_TABLE} (
+            tanggal, waktu, image,
+            pred_class_1, conf_1,
+            pred_class_2, conf_2,
+            pred_class_3, conf_3
+        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+    """, batch)
+
+
+def legacy_where(q):
+    # Salinan logika /search sebelum query planner
+    if "=" in q:
+        field, value = q.split("=", 1)
+        return f"{field.strip()} LIKE %s", [f"%{value.strip()}%"]
+    return " OR ".join(f"{field} LIKE %s" for field in SEARCH_FIELDS), [f"%{q}%"] * len(SEARCH_FIELDS)
+
+
+def run_query(cursor, where, params, repeat):
+    query = f"""
+        SELECT tanggal, waktu, image, pred_class_1, pred_class_2, pred_class_3
+        FROM {BENCH_TABLE} WHERE {where}
+        ORDER BY tanggal DESC, waktu DESC LIMIT 30
+    """
+    cursor.execute("EXPLAIN " + query, params)
+    plan = cursor.fetchall()
+
+    timings = []
+    for _ in range(repeat):
+        start = perf_counter()
+        cursor.execute(query, params)
+        cursor.fetchall()
+        timings.append(perf_counter() - start)
+    return plan, sorted(timings)[len(timings) // 2]
+
+
+def describe_plan(plan):
+    return "; ".join(f"type={row['type']} key={row['key']} rows={row['rows']}" for row in plan)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--skip-seed", action="store_true")
+    parser.add_argument("--fulltext", action="store_true", help="teks bebas lewat FULLTEXT (SEARCH_FULLTEXT=1)")
+    args = parser.parse_args()
+
+    db = connect()
+    if not args.skip_seed:
+        start = perf_counter()
+        seed(db, args.rows)
+        print(f"Seed {args.rows} baris ke {BENCH_TABLE}: {perf_counter() - start:.1f} s")
+
+    cursor = db.cursor(dictionary=True)
+    print(f"{'input':<22} {'lama (ms)':>10} {'baru (ms)':>10}  rencana baru")
+    for q in SAMPLE_QUERIES:
+        old_plan, old_time = run_query(cursor, *legacy_where(q), args.repeat)
+        new_where, new_params = build_search_query(q, CLASS_LABELS, args.fulltext)
+        new_plan, new_time = run_query(cursor, new_where, new_params, args.repeat)
+        print(f"{q:<22} {old_time * 1000:>10.1f} {new_time * 1000:>10.1f}  {describe_plan(new_plan)}")
+        print(f"{'':<22} {'':>10} {'':>10}  (lama: {describe_plan(old_plan)})")
+
+    cursor.close()
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
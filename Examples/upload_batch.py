@@ -0,0 +1,84 @@
+import hashlib
+import json
+import os
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Base URL API (tanpa / di akhir)
+API_URL = 'https://api-classify.smartfarm.id'
+
+# Dapatkan path absolut dari direktori tempat file ini berada
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Path absolut ke folder 'segmented' (yang berisi gambar cabai, ganti 'segmented' sama nama folder tempat gambar cabai di raspi)
+LOCAL_FOLDER = os.path.join(ROOT_DIR, 'segmented')
+
+# Jalankan klasifikasi langsung setelah upload selesai
+CLASSIFY_AFTER_UPLOAD = True
+
+# Satu session untuk semua request: koneksi TLS dipakai ulang, dan request yang gagal karena
+# jaringan dicoba ulang otomatis. Retry bawaan urllib3 tidak mengulang POST yang sudah sampai ke
+# server (mis. /classify yang timeout bisa saja sudah berjalan), kecuali error saat menyambung.
+session = requests.Session()
+retry = Retry(total=5, backoff_factor=1, status_forcelist=[502, 503, 504])
+session.mount('https://', HTTPAdapter(max_retries=retry))
+session.mount('http://', HTTPAdapter(max_retries=retry))
+# /upload-batch aman dikirim ulang: file dengan nama dan isi yang sama dijawab 'duplicate'
+upload_retry = Retry(total=5, backoff_factor=1, status_forcelist=[502, 503, 504], allowed_methods=None)
+session.mount(f'{API_URL}/upload-batch', HTTPAdapter(max_retries=upload_retry))
+
+
+def sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def upload_batch(capture_id, filenames):
+    # Semua file dalam satu request multipart, dengan checksum supaya server bisa menolak file yang rusak
+    checksums = {name: sha256_file(os.path.join(LOCAL_FOLDER, name)) for name in filenames}
+    handles = [open(os.path.join(LOCAL_FOLDER, name), 'rb') for name in filenames]
+    try:
+        files = [('files', (name, f)) for name, f in zip(filenames, handles)]
+        data = {'capture_id': capture_id, 'checksums': json.dumps(checksums)}
+        response = session.post(f'{API_URL}/upload-batch', files=files, data=data, timeout=120)
+    finally:
+        for f in handles:
+            f.close()
+    return response
+
+
+filenames = sorted(f for f in os.listdir(LOCAL_FOLDER) if os.path.isfile(os.path.join(LOCAL_FOLDER, f)))
+if not filenames:
+    print('Tidak ada file di folder segmented.')
+    raise SystemExit(0)
+
+capture_id = session.post(f'{API_URL}/begin-capture', timeout=30).json()['capture_id']
+print(f'Capture {capture_id}: {len(filenames)} file')
+
+# Kirim ulang hanya file yang gagal (maksimal 3 kali)
+pending = filenames
+for attempt in range(3):
+    response = upload_batch(capture_id, pending)
+    if response.status_code not in (200, 422):
+        print(f'Upload gagal: {response.status_code} - {response.text}')
+        raise SystemExit(1)
+
+    manifest = response.json()['files']
+    for entry in manifest:
+        print(f"{entry['file']}: {entry['status']}")
+    # 'duplicate' berarti file dengan nama dan isi yang sama sudah ada di server (mis. kiriman ulang)
+    pending = [entry['file'] for entry in manifest if entry['status'] not in ('ok', 'duplicate')]
+    if not pending:
+        break
+
+if pending:
+    print(f'File gagal diunggah: {pending}')
+    raise SystemExit(1)
+
+if CLASSIFY_AFTER_UPLOAD:
+    response = session.post(f'{API_URL}/classify', json={'capture_id': capture_id}, timeout=30)
+    print(f'Classify: {response.status_code} - {response.text}')
@@ -1,34 +1,1033 @@
 import os
+import re
 import base64
 import shutil
 import json
 from datetime import datetime, date, time
 from datetime import timedelta
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context, send_from_directory, send_file, url_for, g, has_request_context
 from decimal import Decimal
 from PIL import Image
 import threading
+import heapq
+import bisect
+import queue
+import uuid
+import hashlib
+from functools import wraps
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
 import mysql.connector
-from ultralytics import YOLO
+from mysql.connector import pooling
+from contextlib import contextmanager, nullcontext
 from dotenv import load_dotenv
 from flask_cors import CORS
 import mimetypes
+try:
+    import fcntl
+except ImportError:  # Windows (development lokal): tanpa lock antar proses
+    fcntl = None
+import ast
+from types import SimpleNamespace
+import textwrap
+import cProfile
+import tarfile
+import tempfile
+import zipfile
+from time import perf_counter, sleep
 
 load_dotenv()
 
 app = Flask(__name__)
 
 FRONTEND_ORIGIN = "http://localhost:3000"
-CORS(app, supports_credentials=True, origins=[FRONTEND_ORIGIN, "chrome-extension://*", "moz-extension://*", "http://127.0.0.1:3000", "null"])
+CORS(app, supports_credentials=True, origins=[FRONTEND_ORIGIN, "chrome-extension://*", "moz-extension://*", "http://127.0.0.1:3000", "null"],
+     expose_headers=["X-Next-Cursor", "Server-Timing"])
 
 # Definisi path berbasis direktori root skrip ini
 ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
 TEMP_DIR = os.path.join(ROOT_DIR, 'Temp')
+STAGING_DIR = os.path.join(ROOT_DIR, 'Staging')
+# Capture yang gagal dipindahkan ke Storage disisihkan ke sini supaya tidak diselesaikan berulang kali
+STAGING_FAILED_DIR = os.path.join(STAGING_DIR, 'failed')
 STORAGE_DIR = os.path.join(ROOT_DIR, 'Storage')
 MODEL_PATH = os.path.join(ROOT_DIR, 'Model', 'best.pt')
 RESULTS_DIR = os.path.join(ROOT_DIR, 'Results')
 SCHEDULE_FILE = os.path.join(ROOT_DIR, 'Scheduler/schedule_config.json')
 
+# Lama cache browser (detik) untuk gambar di Storage; isi folder bertimestamp tidak pernah berubah
+IMAGE_CACHE_MAX_AGE = int(os.getenv("IMAGE_CACHE_MAX_AGE", "86400"))
+
+# Cache thumbnail di disk: ukuran yang diizinkan, format, dan batas total ukuran cache (LRU)
+THUMBNAIL_DIR = os.path.join(ROOT_DIR, 'Thumbnails')
+THUMBNAIL_SIZES = [int(x) for x in os.getenv("THUMBNAIL_SIZES", "128,256").split(",")]
+THUMBNAIL_FORMAT = os.getenv("THUMBNAIL_FORMAT", "JPEG").upper()  # JPEG atau WEBP
+THUMBNAIL_CACHE_MAX_BYTES = int(os.getenv("THUMBNAIL_CACHE_MAX_MB", "200")) * 1024 * 1024
+
+# Ukuran gambar dummy untuk warm-up model setelah dimuat
+MODEL_WARMUP_SIZE = int(os.getenv("MODEL_WARMUP_SIZE", "224"))
+# Jumlah crop maksimum per forward pass saat /classify
+CLASSIFY_BATCH_SIZE = int(os.getenv("CLASSIFY_BATCH_SIZE", "32"))
+# Backend inferensi: "torch" (ultralytics + PyTorch) atau "onnx" (ONNX Runtime di CPU, file dari export_onnx.py).
+# ONNX_MODEL_PATH bisa diarahkan ke Model/best.int8.onnx untuk varian terkuantisasi.
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch").lower()
+ONNX_MODEL_PATH = os.getenv("ONNX_MODEL_PATH", os.path.join(ROOT_DIR, 'Model', 'best.onnx'))
+# Jumlah thread intra-op untuk inferensi (0 = bawaan runtime)
+INFERENCE_THREADS = int(os.getenv("INFERENCE_THREADS", "0"))
+# Decode + resize crop berjalan di thread pool terpisah dari forward pass (Pillow melepas GIL saat
+# decode/resize). PREFETCH_BATCHES = jumlah batch yang sudah mulai di-decode di depan batch yang
+# sedang masuk model; membatasi memori gambar yang menunggu.
+DECODE_WORKERS = int(os.getenv("DECODE_WORKERS", "0")) or (os.cpu_count() or 1)
+PREFETCH_BATCHES = max(0, int(os.getenv("PREFETCH_BATCHES", "1")))
+# JPEG yang jauh lebih besar dari input model di-decode langsung di skala 1/2, 1/4 atau 1/8 (draft mode)
+DECODE_DRAFT = os.getenv("DECODE_DRAFT", "1") == "1"
+
+# Instrumentasi: durasi setiap tahap dicatat ke histogram (detik) yang diekspor dalam format teks
+# Prometheus di /metrics. Registry ini per proses; di Passenger setiap worker punya angkanya sendiri.
+METRIC_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+METRIC_HELP = {
+    "smartfarm_http_request_seconds": "Durasi request HTTP per endpoint.",
+    "smartfarm_classify_stage_seconds": "Durasi tahap per run klasifikasi.",
+    "smartfarm_pipeline_stage_seconds": "Durasi tahap per micro-batch pipeline.",
+    "smartfarm_get_data_stage_seconds": "Durasi tahap /get-data per request.",
+    "smartfarm_task_seconds": "Durasi task scheduler dan retensi.",
+}
+# Header Server-Timing: selalu (SERVER_TIMING=1) atau per request dengan header "X-Server-Timing: 1"
+SERVER_TIMING = os.getenv("SERVER_TIMING", "0") == "1"
+# Profil satu request dengan ?profile=1 (cProfile) atau ?profile=pyinstrument, hanya jika PROFILE_REQUESTS=1
+PROFILE_REQUESTS = os.getenv("PROFILE_REQUESTS", "0") == "1"
+PROFILE_DIR = os.path.join(ROOT_DIR, 'Profiles')
+
+_metrics_lock = threading.Lock()
+_histograms = {}  # nama -> {label (tuple) -> [jumlah per bucket, total, count]}
+
+
+def observe(name, seconds, **labels):
+    key = tuple(sorted(labels.items()))
+    with _metrics_lock:
+        series = _histograms.setdefault(name, {}).get(key)
+        if series is None:
+            series = _histograms[name][key] = [[0] * len(METRIC_BUCKETS), 0.0, 0]
+        i = bisect.bisect_left(METRIC_BUCKETS, seconds)
+        if i < len(METRIC_BUCKETS):
+            series[0][i] += 1
+        series[1] += seconds
+        series[2] += 1
+
+
+def add_server_timing(name, seconds):
+    if has_request_context():
+        entries = g.setdefault("server_timing", {})
+        entries[name] = entries.get(name, 0.0) + seconds
+
+
+@contextmanager
+def stage_timer(timings, stage):
+    # Akumulasi durasi tahap ke dict timings; dicatat ke histogram sekali per run/request lewat record_stages
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + perf_counter() - start
+
+
+def record_stages(metric, timings, **labels):
+    for stage, seconds in timings.items():
+        if isinstance(seconds, (int, float)):
+            observe(metric, seconds, stage=stage, **labels)
+            add_server_timing(stage, seconds)
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"') for _, value in pairs)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + "}"
+
+
+def render_metrics():
+    lines = []
+    with _metrics_lock:
+        for name in sorted(_histograms):
+            lines.append(f"# HELP {name} {METRIC_HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} histogram")
+            for labels, (buckets, total, count) in sorted(_histograms[name].items()):
+                cumulative = 0
+                for bound, bucket_count in zip(METRIC_BUCKETS, buckets):
+                    cumulative += bucket_count
+                    lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {count}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+                lines.append(f"{name}_count{_format_labels(labels)} {count}")
+    return lines
+
+
+# Registry model per proses: model dimuat sekali lalu dipakai ulang oleh semua request dan scheduler.
+# RLock dipakai juga selama inferensi karena predictor ultralytics tidak thread-safe.
+_model_lock = threading.RLock()
+_model_state = {"model": None, "signature": None, "loaded_at": None, "version": None}
+
+
+class OnnxClassifier:
+    """Classifier YOLO hasil export ONNX, dijalankan dengan ONNX Runtime.
+
+    Meniru atribut YOLO yang dipakai app.py (model.names dan model.args["imgsz"]) dan preprocessing
+    classify ultralytics (resize sisi terpendek, center crop, skala 0-1), sehingga top-3 yang
+    dihasilkan berformat sama dengan backend torch."""
+
+    def __init__(self, path, threads=0):
+        try:
+            import onnxruntime
+        except ImportError:  # Opsional, hanya dibutuhkan untuk INFERENCE_BACKEND=onnx
+            raise RuntimeError("INFERENCE_BACKEND=onnx membutuhkan paket onnxruntime.")
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        # Export tanpa dynamic=True punya ukuran batch tetap
+        self.batch_size = model_input.shape[0] if isinstance(model_input.shape[0], int) else None
+
+        # Metadata yang ditulis ultralytics saat export: names dan imgsz
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        names = ast.literal_eval(metadata["names"]) if "names" in metadata else {}
+        imgsz = ast.literal_eval(metadata["imgsz"]) if "imgsz" in metadata else model_input.shape[-1]
+        self.model = SimpleNamespace(names=names, args={"imgsz": imgsz})
+        self.imgsz = imgsz[0] if isinstance(imgsz, (list, tuple)) else int(imgsz)
+
+    def preprocess(self, img):
+        import numpy as np
+
+        width, height = img.size
+        if min(width, height) != self.imgsz:
+            # Sama dengan torchvision Resize(int): sisi terpendek = imgsz, sisi lain dipotong ke int
+            if width <= height:
+                size = (self.imgsz, int(self.imgsz * height / width))
+            else:
+                size = (int(self.imgsz * width / height), self.imgsz)
+            img = img.resize(size, Image.BILINEAR)
+            width, height = img.size
+        left = int(round((width - self.imgsz) / 2.0))
+        top = int(round((height - self.imgsz) / 2.0))
+        img = img.crop((left, top, left + self.imgsz, top + self.imgsz))
+        return np.asarray(img, dtype=np.float32).transpose(2, 0, 1) / 255.0
+
+    def predict_probs(self, images):
+        import numpy as np
+
+        batch = np.stack([self.preprocess(img.convert("RGB")) for img in images])
+        if self.batch_size is None:
+            return self.session.run(None, {self.input_name: batch})[0]
+        return np.concatenate([
+            self.session.run(None, {self.input_name: batch[i:i + self.batch_size]})[0]
+            for i in range(0, len(batch), self.batch_size)
+        ])
+
+
+def active_model_path():
+    return ONNX_MODEL_PATH if INFERENCE_BACKEND == "onnx" else MODEL_PATH
+
+
+def _model_signature():
+    # mtime + ukuran file cukup untuk mendeteksi best.pt yang diganti tanpa perlu hash seluruh file
+    try:
+        stat = os.stat(active_model_path())
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def get_model():
+    """Ambil model YOLO yang sudah hangat, muat ulang otomatis jika Model/best.pt berubah."""
+    signature = _model_signature()
+    with _model_lock:
+        if _model_state["model"] is None or (signature is not None and signature != _model_state["signature"]):
+            if INFERENCE_BACKEND == "onnx":
+                model = OnnxClassifier(ONNX_MODEL_PATH, INFERENCE_THREADS)
+            else:
+                # Diimpor di sini, bukan di awal modul: ultralytics + torch butuh beberapa detik dan
+                # worker yang hanya melayani /get-data, /search, dll. tidak perlu menanggungnya
+                import torch
+                from ultralytics import YOLO
+
+                if INFERENCE_THREADS:
+                    torch.set_num_threads(INFERENCE_THREADS)
+                model = YOLO(MODEL_PATH)
+            # Warm-up supaya request pertama tidak menanggung setup graph
+            predict_top3_batch(model, [Image.new("RGB", (MODEL_WARMUP_SIZE, MODEL_WARMUP_SIZE))])
+            _model_state["model"] = model
+            _model_state["signature"] = signature
+            _model_state["loaded_at"] = datetime.now()
+            _model_state["version"] = get_model_version(signature)
+            print(f"Model dimuat dari {active_model_path()}")
+        return _model_state["model"]
+
+
+def get_model_version(signature=None):
+    # Versi bobot = nama file + mtime, disimpan di tabel run untuk melacak model yang dipakai
+    signature = signature or _model_state["signature"] or _model_signature()
+    if signature is None:
+        return None
+    mtime = datetime.fromtimestamp(signature[0] / 1e9).strftime("%Y%m%d%H%M%S")
+    return f"{os.path.basename(active_model_path())}@{mtime}"
+
+
+def preload_model():
+    # Dipanggil dari passenger_wsgi.py agar model sudah siap sebelum request pertama
+    threading.Thread(target=get_model, daemon=True).start()
+
+
+def get_model_imgsz(model):
+    imgsz = getattr(model.model, "args", {}).get("imgsz", MODEL_WARMUP_SIZE)
+    if isinstance(imgsz, (list, tuple)):
+        imgsz = imgsz[0]
+    return int(imgsz)
+
+
+def load_crop(image_path, imgsz):
+    """Decode crop dan perkecil sisi terpendeknya ke ukuran input model."""
+    with Image.open(image_path) as img:
+        if DECODE_DRAFT and img.format == "JPEG" and min(img.size) >= 2 * imgsz:
+            # Draft mode memilih skala DCT terkecil yang hasilnya masih >= ukuran yang diminta,
+            # jadi sisi terpendek tidak pernah turun di bawah imgsz sebelum resize di bawah
+            scale = imgsz / min(img.size)
+            img.draft("RGB", (round(img.size[0] * scale), round(img.size[1] * scale)))
+        img = img.convert("RGB")
+    width, height = img.size
+    scale = imgsz / min(width, height)
+    if scale < 1:
+        img = img.resize((max(imgsz, round(width * scale)), max(imgsz, round(height * scale))), Image.BILINEAR)
+    return img
+
+
+def predict_top3_batch(model, images):
+    """Satu forward pass untuk seluruh batch, lalu top-3 dengan satu topk tervektorisasi."""
+    if isinstance(model, OnnxClassifier):
+        # numpy (~100 ms) hanya dibutuhkan backend ONNX; worker tanpa inferensi tidak perlu mengimpornya
+        import numpy as np
+
+        probs = model.predict_probs(images)
+        top_idx = np.argsort(-probs, axis=1, kind="stable")[:, :3]
+        top_conf = np.take_along_axis(probs, top_idx, axis=1)
+        names = model.model.names
+        return [([names[i] for i in idx_row], conf_row)
+                for conf_row, idx_row in zip(top_conf.tolist(), top_idx.tolist())]
+
+    import torch
+
+    results = model.predict(images, verbose=False)
+    probs = torch.stack([r.probs.data for r in results])
+    top_conf, top_idx = torch.topk(probs, k=3, dim=1)
+
+    names = model.model.names
+    top3_batch = []
+    for conf_row, idx_row in zip(top_conf.tolist(), top_idx.tolist()):
+        top3_batch.append(([names[i] for i in idx_row], conf_row))
+    return top3_batch
+
+
+# Pool koneksi MySQL bersama untuk semua endpoint (ukuran diatur lewat .env)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+
+_db_pool = None
+_db_pool_lock = threading.Lock()
+_db_pool_stats = {"hits": 0, "misses": 0, "timeouts": 0, "reconnects": 0, "wait_time_total": 0.0, "wait_time_max": 0.0}
+
+
+def get_db_pool():
+    global _db_pool
+    with _db_pool_lock:
+        if _db_pool is None:
+            _db_pool = pooling.MySQLConnectionPool(
+                pool_name="smartfarm_pool",
+                pool_size=DB_POOL_SIZE,
+                pool_reset_session=True,
+                host=os.getenv("DB_HOST"),
+                user=os.getenv("DB_USER"),
+                password=os.getenv("DB_PASS"),
+                database=os.getenv("DB_NAME")
+            )
+        return _db_pool
+
+
+@contextmanager
+def get_db():
+    """Pinjam koneksi dari pool; koneksi otomatis dikembalikan ke pool di akhir blok with."""
+    pool = get_db_pool()
+    start = perf_counter()
+    waited = False
+    while True:
+        try:
+            db = pool.get_connection()
+            break
+        except mysql.connector.errors.PoolError:
+            # Pool habis: tunggu koneksi lain dikembalikan sampai batas DB_POOL_TIMEOUT
+            waited = True
+            if perf_counter() - start > DB_POOL_TIMEOUT:
+                with _db_pool_lock:
+                    _db_pool_stats["timeouts"] += 1
+                raise
+            sleep(0.05)
+    wait_time = perf_counter() - start
+
+    with _db_pool_lock:
+        _db_pool_stats["misses" if waited else "hits"] += 1
+        _db_pool_stats["wait_time_total"] += wait_time
+        _db_pool_stats["wait_time_max"] = max(_db_pool_stats["wait_time_max"], wait_time)
+
+    try:
+        # Health check: koneksi yang sudah diputus server disambung ulang sebelum dipakai
+        if not db.is_connected():
+            db.reconnect(attempts=3, delay=1)
+            with _db_pool_lock:
+                _db_pool_stats["reconnects"] += 1
+        yield db
+    finally:
+        db.close()
+
+
+@app.route('/pool-stats', methods=['GET'])
+def pool_stats():
+    with _db_pool_lock:
+        stats = dict(_db_pool_stats)
+    checkouts = stats["hits"] + stats["misses"]
+    stats["pool_size"] = DB_POOL_SIZE
+    stats["hit_ratio"] = round(stats["hits"] / checkouts, 4) if checkouts else None
+    stats["wait_time_avg"] = round(stats["wait_time_total"] / checkouts, 6) if checkouts else None
+    return jsonify(stats)
+
+
+# Cache hasil endpoint baca (/get-data, /filter-directories). Entri berlaku selama TTL dan
+# selama "generasi" data belum berubah; setiap jalur tulis memanggil invalidate_result_cache()
+# yang mengganti isi file Cache/generation, sehingga worker Passenger lain ikut membuang cache-nya.
+# Dengan RESULT_CACHE_SHARED=1 isi cache juga disimpan di Cache/ agar bisa dipakai bersama.
+CACHE_DIR = os.path.join(ROOT_DIR, 'Cache')
+CACHE_GENERATION_FILE = os.path.join(CACHE_DIR, 'generation')
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "60"))
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "256"))
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_MB", "64")) * 1024 * 1024
+RESULT_CACHE_SHARED = os.getenv("RESULT_CACHE_SHARED", "0") == "1"
+
+_result_cache = OrderedDict()  # key -> entry, urutan = terakhir dipakai
+_result_cache_lock = threading.Lock()
+_result_cache_state = {"bytes": 0, "invalidations": 0, "evictions": 0}
+_result_cache_stats = {}  # namespace -> {"hits", "misses"}
+
+
+def _cache_generation():
+    try:
+        with open(CACHE_GENERATION_FILE) as f:
+            return f.read()
+    except FileNotFoundError:
+        return ""
+
+
+def invalidate_result_cache():
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp_path = f"{CACHE_GENERATION_FILE}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(uuid.uuid4().hex)
+    os.replace(tmp_path, CACHE_GENERATION_FILE)
+
+    with _result_cache_lock:
+        _result_cache.clear()
+        _result_cache_state["bytes"] = 0
+        _result_cache_state["invalidations"] += 1
+
+    if RESULT_CACHE_SHARED:
+        for name in os.listdir(CACHE_DIR):
+            if name.endswith(".json"):
+                try:
+                    os.remove(os.path.join(CACHE_DIR, name))
+                except FileNotFoundError:
+                    pass
+
+
+def _cache_file_path(key):
+    return os.path.join(CACHE_DIR, hashlib.sha1(key.encode()).hexdigest() + ".json")
+
+
+def _cache_get(key, generation):
+    now = datetime.now().timestamp()
+    with _result_cache_lock:
+        entry = _result_cache.get(key)
+        if entry is not None:
+            if entry["generation"] == generation and entry["expires"] > now:
+                _result_cache.move_to_end(key)
+                return entry
+            _result_cache_state["bytes"] -= len(_result_cache.pop(key)["body"])
+
+    if RESULT_CACHE_SHARED:
+        try:
+            with open(_cache_file_path(key)) as f:
+                entry = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        if entry["generation"] == generation and entry["expires"] > now:
+            _cache_put_memory(key, entry)
+            return entry
+    return None
+
+
+def _cache_put_memory(key, entry):
+    with _result_cache_lock:
+        if key in _result_cache:
+            _result_cache_state["bytes"] -= len(_result_cache.pop(key)["body"])
+        _result_cache[key] = entry
+        _result_cache_state["bytes"] += len(entry["body"])
+        while _result_cache and (len(_result_cache) > RESULT_CACHE_MAX_ENTRIES
+                                 or _result_cache_state["bytes"] > RESULT_CACHE_MAX_BYTES):
+            _, evicted = _result_cache.popitem(last=False)
+            _result_cache_state["bytes"] -= len(evicted["body"])
+            _result_cache_state["evictions"] += 1
+
+
+def _cache_put(key, entry):
+    _cache_put_memory(key, entry)
+    if RESULT_CACHE_SHARED:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        path = _cache_file_path(key)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+
+        # Batasi jumlah file cache; yang paling lama tidak ditulis dibuang lebih dulu
+        files = [os.path.join(CACHE_DIR, name) for name in os.listdir(CACHE_DIR) if name.endswith(".json")]
+        if len(files) > RESULT_CACHE_MAX_ENTRIES:
+            files.sort(key=lambda p: os.path.getmtime(p) if os.path.exists(p) else 0)
+            for old_path in files[:len(files) - RESULT_CACHE_MAX_ENTRIES]:
+                try:
+                    os.remove(old_path)
+                except FileNotFoundError:
+                    pass
+
+
+def cached_json_response(namespace):
+    """Decorator: cache respons 200 dari view berdasarkan body JSON dan query string yang dinormalisasi."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = namespace + "|" + json.dumps({
+                "args": sorted(request.args.items(multi=True)),
+                "body": request.get_json(silent=True)
+            }, sort_keys=True, default=str)
+            generation = _cache_generation()
+
+            with _result_cache_lock:
+                stats = _result_cache_stats.setdefault(namespace, {"hits": 0, "misses": 0})
+
+            entry = _cache_get(key, generation)
+            if entry is not None:
+                with _result_cache_lock:
+                    stats["hits"] += 1
+                return Response(entry["body"], status=entry["status"], headers=entry["headers"], mimetype="application/json")
+
+            with _result_cache_lock:
+                stats["misses"] += 1
+            response = app.make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                _cache_put(key, {
+                    "generation": generation,
+                    "expires": datetime.now().timestamp() + RESULT_CACHE_TTL,
+                    "status": response.status_code,
+                    "headers": {k: v for k, v in response.headers.items() if k == "X-Next-Cursor"},
+                    "body": response.get_data(as_text=True)
+                })
+            return response
+        return wrapper
+    return decorator
+
+
+@app.route('/cache-stats', methods=['GET'])
+def cache_stats():
+    with _result_cache_lock:
+        namespaces = {}
+        for namespace, stats in _result_cache_stats.items():
+            lookups = stats["hits"] + stats["misses"]
+            namespaces[namespace] = dict(stats, hit_ratio=round(stats["hits"] / lookups, 4) if lookups else None)
+        return jsonify({
+            "entries": len(_result_cache),
+            "bytes": _result_cache_state["bytes"],
+            "invalidations": _result_cache_state["invalidations"],
+            "evictions": _result_cache_state["evictions"],
+            "shared": RESULT_CACHE_SHARED,
+            "namespaces": namespaces
+        })
+
+
+# Skema database, diterapkan lewat init_db() (migrate.py saat deploy atau worker start)
+SCHEMA_STATEMENTS = [
+    """
+    CREATE TABLE IF NOT EXISTS chili_predictions_v1 (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        tanggal DATE,
+        waktu TIME,
+        image VARCHAR(255),
+        pred_class_1 VARCHAR(100),
+        conf_1 FLOAT,
+        pred_class_2 VARCHAR(100),
+        conf_2 FLOAT,
+        pred_class_3 VARCHAR(100),
+        conf_3 FLOAT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS chili_runs_v1 (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        tanggal DATE,
+        waktu TIME,
+        folder VARCHAR(64),
+        model_version VARCHAR(100),
+        jumlah_gambar INT,
+        duration FLOAT,
+        UNIQUE KEY uq_runs_folder (folder),
+        KEY idx_runs_tanggal_waktu (tanggal, waktu)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS chili_schema_version_v1 (
+        id TINYINT PRIMARY KEY,
+        version VARCHAR(40),
+        applied_at DATETIME
+    )
+    """,
+]
+
+# Teks bebas /search lewat FULLTEXT (awalan kata) alih-alih substring. Lebih cepat, tetapi hasilnya lebih sempit:
+# "_1" atau "rop" tidak lagi cocok dengan "crop_1.jpg". Default mati, jadi hasil /search sama seperti dulu.
+SEARCH_FULLTEXT = os.getenv("SEARCH_FULLTEXT", "0") == "1"
+
+# Perubahan skema pada tabel yang sudah ada. MySQL tidak punya ADD COLUMN/INDEX IF NOT EXISTS,
+# jadi setiap entri dicek dulu di information_schema: (jenis, tabel, nama, DDL)
+SCHEMA_MIGRATIONS = [
+    ("column", "chili_predictions_v1", "run_id", """
+        ALTER TABLE chili_predictions_v1
+        ADD COLUMN run_id INT NULL,
+        ADD CONSTRAINT fk_predictions_run FOREIGN KEY (run_id) REFERENCES chili_runs_v1 (id) ON DELETE SET NULL
+    """),
+    # Index untuk /search dan /get-data. InnoDB menambahkan primary key ke setiap secondary index,
+    # jadi idx_pred_tanggal_waktu sekaligus menjadi index (tanggal, waktu, id) untuk keyset pagination
+    ("index", "chili_predictions_v1", "idx_pred_tanggal_waktu",
+     "CREATE INDEX idx_pred_tanggal_waktu ON chili_predictions_v1 (tanggal, waktu)"),
+    ("index", "chili_predictions_v1", "idx_pred_image",
+     "CREATE INDEX idx_pred_image ON chili_predictions_v1 (image)"),
+    ("index", "chili_predictions_v1", "idx_pred_class_1",
+     "CREATE INDEX idx_pred_class_1 ON chili_predictions_v1 (pred_class_1)"),
+    ("index", "chili_predictions_v1", "idx_pred_class_2",
+     "CREATE INDEX idx_pred_class_2 ON chili_predictions_v1 (pred_class_2)"),
+    ("index", "chili_predictions_v1", "idx_pred_class_3",
+     "CREATE INDEX idx_pred_class_3 ON chili_predictions_v1 (pred_class_3)"),
+    # Agregat jumlah dan total confidence pred_class_1 per hari dan per run untuk /stats.
+    # Saat tabel dibuat pertama kali, isinya di-backfill dari data prediksi yang sudah ada.
+    ("table", "chili_stats_daily_v1", None, [
+        """
+        CREATE TABLE chili_stats_daily_v1 (
+            tanggal DATE NOT NULL,
+            pred_class VARCHAR(100) NOT NULL,
+            jumlah INT NOT NULL,
+            total_conf DOUBLE NOT NULL,
+            PRIMARY KEY (tanggal, pred_class)
+        )
+        """,
+        """
+        INSERT INTO chili_stats_daily_v1 (tanggal, pred_class, jumlah, total_conf)
+        SELECT tanggal, pred_class_1, COUNT(*), SUM(conf_1)
+        FROM chili_predictions_v1
+        WHERE tanggal IS NOT NULL AND pred_class_1 IS NOT NULL
+        GROUP BY tanggal, pred_class_1
+        """,
+    ]),
+    ("table", "chili_stats_run_v1", None, [
+        """
+        CREATE TABLE chili_stats_run_v1 (
+            run_id INT NOT NULL,
+            pred_class VARCHAR(100) NOT NULL,
+            jumlah INT NOT NULL,
+            total_conf DOUBLE NOT NULL,
+            PRIMARY KEY (run_id, pred_class),
+            CONSTRAINT fk_stats_run FOREIGN KEY (run_id) REFERENCES chili_runs_v1 (id) ON DELETE CASCADE
+        )
+        """,
+        """
+        INSERT INTO chili_stats_run_v1 (run_id, pred_class, jumlah, total_conf)
+        SELECT run_id, pred_class_1, COUNT(*), SUM(conf_1)
+        FROM chili_predictions_v1
+        WHERE run_id IS NOT NULL AND pred_class_1 IS NOT NULL
+        GROUP BY run_id, pred_class_1
+        """,
+    ]),
+    # Cache hasil top-3 per isi gambar (sha256) dan versi model
+    ("table", "chili_image_cache_v1", None, [
+        """
+        CREATE TABLE chili_image_cache_v1 (
+            sha256 CHAR(64) NOT NULL,
+            model_version VARCHAR(100) NOT NULL,
+            pred_class_1 VARCHAR(100),
+            conf_1 FLOAT,
+            pred_class_2 VARCHAR(100),
+            conf_2 FLOAT,
+            pred_class_3 VARCHAR(100),
+            conf_3 FLOAT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (sha256, model_version)
+        )
+        """,
+    ]),
+]
+
+# Index FULLTEXT hanya dipakai /search jika SEARCH_FULLTEXT=1. Saat mati index tidak dibuat (dan yang
+# sudah ada dibuang), supaya deploy tidak menunggu build index dan setiap INSERT prediksi tidak ikut
+# memperbarui index yang tidak pernah dibaca
+FULLTEXT_MIGRATION = ("index", "chili_predictions_v1", "ft_pred_text",
+                      "CREATE FULLTEXT INDEX ft_pred_text ON chili_predictions_v1 "
+                      "(image, pred_class_1, pred_class_2, pred_class_3)")
+
+# Sidik skema: berubah setiap kali DDL di atas (atau SEARCH_FULLTEXT) berubah. Worker yang start cukup
+# membandingkannya dengan chili_schema_version_v1 (satu query) tanpa cek information_schema per objek.
+SCHEMA_VERSION = hashlib.sha1(repr((SCHEMA_STATEMENTS, SCHEMA_MIGRATIONS, SEARCH_FULLTEXT)).encode()).hexdigest()[:12]
+# Jalankan migrasi saat worker start jika versi berbeda. Migrasi sebaiknya lewat `python migrate.py`
+# saat deploy; dengan MIGRATE_ON_START=0 worker hanya mengecek versi dan melaporkannya.
+MIGRATE_ON_START = os.getenv("MIGRATE_ON_START", "1") == "1"
+SCHEMA_LOCK_NAME = "smartfarm_init_db"
+_schema_state = {"status": "unknown", "version": None, "error": None, "checked_at": None}
+
+# Upsert agregat: nilai positif saat insert prediksi, negatif saat /delete
+UPSERT_STATS_DAILY_SQL = """
+    INSERT INTO chili_stats_daily_v1 (tanggal, pred_class, jumlah, total_conf)
+    VALUES (%s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE jumlah = jumlah + VALUES(jumlah), total_conf = total_conf + VALUES(total_conf)
+"""
+
+UPSERT_STATS_RUN_SQL = """
+    INSERT INTO chili_stats_run_v1 (run_id, pred_class, jumlah, total_conf)
+    VALUES (%s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE jumlah = jumlah + VALUES(jumlah), total_conf = total_conf + VALUES(total_conf)
+"""
+
+INSERT_RUN_SQL = """
+    INSERT INTO chili_runs_v1 (tanggal, waktu, folder, model_version)
+    VALUES (%s, %s, %s, %s)
+"""
+
+INSERT_IMAGE_CACHE_SQL = """
+    INSERT IGNORE INTO chili_image_cache_v1 (
+        sha256, model_version,
+        pred_class_1, conf_1,
+        pred_class_2, conf_2,
+        pred_class_3, conf_3
+    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+"""
+
+INSERT_PREDICTION_SQL = """
+    INSERT INTO chili_predictions_v1 (
+        tanggal, waktu, image,
+        pred_class_1, conf_1,
+        pred_class_2, conf_2,
+        pred_class_3, conf_3,
+        run_id
+    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+"""
+
+
+def _schema_object_exists(cursor, kind, table, name):
+    if kind == "table":
+        cursor.execute("""
+            SELECT COUNT(*) FROM information_schema.TABLES
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+        """, (table,))
+    elif kind == "column":
+        cursor.execute("""
+            SELECT COUNT(*) FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s
+        """, (table, name))
+    else:
+        cursor.execute("""
+            SELECT COUNT(*) FROM information_schema.STATISTICS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s
+        """, (table, name))
+    return cursor.fetchone()[0] > 0
+
+
+def _schema_version_in_db(cursor):
+    try:
+        cursor.execute("SELECT version FROM chili_schema_version_v1 WHERE id = 1")
+        row = cursor.fetchone()
+    except mysql.connector.Error:  # Database lama: tabel versi belum ada
+        return None
+    return row[0] if row else None
+
+
+def _apply_schema(cursor):
+    for statement in SCHEMA_STATEMENTS:
+        cursor.execute(statement)
+    for kind, table, name, statements in SCHEMA_MIGRATIONS:
+        if not _schema_object_exists(cursor, kind, table, name):
+            for statement in ([statements] if isinstance(statements, str) else statements):
+                cursor.execute(statement)
+    kind, table, name, statement = FULLTEXT_MIGRATION
+    exists = _schema_object_exists(cursor, kind, table, name)
+    if SEARCH_FULLTEXT and not exists:
+        cursor.execute(statement)
+    elif not SEARCH_FULLTEXT and exists:
+        cursor.execute(f"DROP INDEX {name} ON {table}")
+    cursor.execute("""
+        REPLACE INTO chili_schema_version_v1 (id, version, applied_at) VALUES (1, %s, %s)
+    """, (SCHEMA_VERSION, datetime.now()))
+
+
+def init_db(migrate=True, wait=0, force=False):
+    """Samakan skema database dengan SCHEMA_VERSION.
+
+    Jika versi di database sudah sama, hanya satu query. Migrasi dijalankan di bawah GET_LOCK MySQL,
+    jadi hanya satu proses yang menjalankannya; proses lain menunggu paling lama `wait` detik lalu
+    melapor "busy". Dengan migrate=False versi hanya dicek. Status (current, migrated, outdated, busy,
+    error) disimpan di _schema_state dan diekspor di /metrics; error diteruskan ke pemanggil."""
+    _schema_state.update(status="unknown", error=None, checked_at=datetime.now())
+    try:
+        with get_db() as db:
+            cursor = db.cursor()
+            try:
+                version = _schema_version_in_db(cursor)
+                if version == SCHEMA_VERSION and not force:
+                    status = "current"
+                elif not migrate:
+                    status = "outdated"
+                else:
+                    cursor.execute("SELECT GET_LOCK(%s, %s)", (SCHEMA_LOCK_NAME, wait))
+                    if not cursor.fetchone()[0]:
+                        status = "busy"
+                    else:
+                        try:
+                            # Cek ulang: proses lain mungkin baru selesai migrasi sebelum lock didapat
+                            version = _schema_version_in_db(cursor)
+                            if version == SCHEMA_VERSION and not force:
+                                status = "current"
+                            else:
+                                _apply_schema(cursor)
+                                db.commit()
+                                version, status = SCHEMA_VERSION, "migrated"
+                        finally:
+                            # Named lock melekat pada koneksi, yang kembali ke pool setelah ini
+                            cursor.execute("SELECT RELEASE_LOCK(%s)", (SCHEMA_LOCK_NAME,))
+                            cursor.fetchone()
+            finally:
+                cursor.close()
+    except Exception as e:
+        _schema_state.update(status="error", error=str(e))
+        raise
+    _schema_state.update(status=status, version=version)
+    if status == "outdated":
+        print(f"Skema database {version} belum sesuai {SCHEMA_VERSION}; jalankan python migrate.py")
+    elif status == "busy":
+        print(f"Skema database {version} belum sesuai {SCHEMA_VERSION}; migrasi sedang berjalan di proses lain")
+    return status
+
+
+# Staging per sesi capture: setiap chamber memanggil /begin-capture, mengunggah ke Staging/<capture_id>/,
+# lalu /classify dengan capture_id yang sama. Folder staging di-rename utuh ke Storage setelah
+# diklasifikasi, jadi upload dari chamber lain atau run lain tidak pernah ikut terbawa.
+CAPTURE_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+_capture_time_lock = threading.Lock()
+_last_capture_time = [None]
+
+
+def get_capture_dir(capture_id):
+    # None jika id tidak valid atau sesi sudah tidak ada (mis. sudah diklasifikasi)
+    if not capture_id or not CAPTURE_ID_PATTERN.match(capture_id):
+        return None
+    path = os.path.join(STAGING_DIR, capture_id)
+    return path if os.path.isdir(path) else None
+
+
+def reserve_capture_time():
+    # Timestamp run unik per detik, karena nama folder Storage, file Results dan chili_runs_v1.folder
+    # diambil dari sini. Antar worker Passenger, file Results run dibuat eksklusif (mode "x") sebagai
+    # penanda: jika sudah ada (worker lain di detik yang sama) atau folder Storage-nya sudah ada,
+    # dipakai detik berikutnya. Pemanggil harus sudah membuat RESULTS_DIR.
+    with _capture_time_lock:
+        now = datetime.now().replace(microsecond=0)
+        if _last_capture_time[0] is not None and now <= _last_capture_time[0]:
+            now = _last_capture_time[0] + timedelta(seconds=1)
+        while True:
+            stamp = now.strftime(STORAGE_FOLDER_FORMAT)
+            if not os.path.exists(os.path.join(STORAGE_DIR, stamp)):
+                try:
+                    open(os.path.join(RESULTS_DIR, f"results_{stamp}.txt"), "x").close()
+                    break
+                except FileExistsError:
+                    pass
+            now += timedelta(seconds=1)
+        _last_capture_time[0] = now
+        return now
+
+
+def list_source_files(source_dir):
+    # File yang masih ditulis (.nama.part) belum dianggap bagian dari capture
+    return sorted(f for f in os.listdir(source_dir)
+                  if not f.startswith(".") and os.path.isfile(os.path.join(source_dir, f)))
+
+
+@app.route('/begin-capture', methods=['POST'])
+def begin_capture():
+    capture_id = uuid.uuid4().hex
+    os.makedirs(os.path.join(STAGING_DIR, capture_id))
+    return jsonify({
+        "capture_id": capture_id,
+        "upload_url": "/upload-image",
+        "classify_url": "/classify"
+    }), 201
+
+
+UPLOAD_CHUNK_SIZE = 64 * 1024
+# Arsip zip perlu seekable: disimpan di memori sampai ukuran ini, selebihnya ke file sementara
+UPLOAD_SPOOL_MAX_BYTES = 8 * 1024 * 1024
+
+
+def _upload_target_dir():
+    # Tanpa capture_id: perilaku lama, langsung ke Temp. None jika capture tidak ada.
+    capture_id = request.form.get('capture_id') or request.headers.get('X-Capture-Id') or request.args.get('capture_id')
+    if capture_id:
+        return get_capture_dir(capture_id)
+    return TEMP_DIR
+
+
+def _safe_upload_name(name):
+    filename = os.path.basename((name or "").replace("\\", "/"))
+    if filename in ("", ".", "..") or filename.startswith("."):
+        return None
+    return filename
+
+
+# Setiap folder upload (Temp dan Staging/<id>) menyimpan daftar "sha256  nama_file" untuk deteksi
+# kiriman ulang dan lookup cache klasifikasi tanpa hash ulang. Folder capture pindah utuh ke
+# Storage/<timestamp> beserta index-nya; untuk Temp, entri file yang dipindahkan ikut dipindahkan
+# ke index folder Storage-nya dan index Temp dipadatkan (_move_hash_entries).
+HASH_INDEX_NAME = ".sha256sums"
+# Jumlah folder yang index-nya disimpan di memori per proses
+HASH_INDEX_CACHE_FOLDERS = 256
+
+_hash_index_lock = threading.Lock()
+_hash_index_cache = OrderedDict()  # folder -> {"inode", "offset", "hashes"}
+
+
+def _cached_hash_index(folder):
+    """{nama_file: sha256} dari index folder, di-cache di memori. Dipanggil dengan _hash_index_lock.
+
+    File index hanya di-append (juga oleh worker lain), jadi cukup baris baru sejak offset terakhir
+    yang dibaca; inode baru atau ukuran yang mengecil berarti index dipadatkan dan dibaca ulang."""
+    path = os.path.join(folder, HASH_INDEX_NAME)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        _hash_index_cache.pop(folder, None)
+        return {}
+    cached = _hash_index_cache.get(folder)
+    if cached is None or cached["inode"] != stat.st_ino or stat.st_size < cached["offset"]:
+        cached = {"inode": stat.st_ino, "offset": 0, "hashes": {}}
+    _hash_index_cache[folder] = cached
+    _hash_index_cache.move_to_end(folder)
+    while len(_hash_index_cache) > HASH_INDEX_CACHE_FOLDERS:
+        _hash_index_cache.popitem(last=False)
+
+    if stat.st_size > cached["offset"]:
+        with open(path, "rb") as f:
+            f.seek(cached["offset"])
+            data = f.read(stat.st_size - cached["offset"])
+        # Baris terakhir bisa saja belum selesai ditulis worker lain; dibaca lagi pada panggilan berikutnya
+        complete = data[:data.rfind(b"\n") + 1]
+        for line in complete.decode().splitlines():
+            digest, _, name = line.partition("  ")
+            if name:
+                cached["hashes"][name] = digest
+        cached["offset"] += len(complete)
+    return cached["hashes"]
+
+
+def read_hash_index(folder):
+    """{nama_file: sha256} untuk file yang masih ada di folder."""
+    with _hash_index_lock:
+        hashes = dict(_cached_hash_index(folder))
+    return {name: digest for name, digest in hashes.items() if os.path.isfile(os.path.join(folder, name))}
+
+
+def _rewrite_index_file(folder, index_name, lines):
+    # Tulis ulang index lewat file sementara + os.replace. Baris yang di-append worker lain di antara
+    # baca dan replace bisa hilang; akibatnya hanya hash dihitung ulang saat classify.
+    path = os.path.join(folder, index_name)
+    with open(path + ".tmp", "w") as f:
+        f.writelines(lines)
+    os.replace(path + ".tmp", path)
+
+
+def _move_hash_entries(source_dir, dest_dir, files):
+    # Entri file yang dipindahkan dari Temp ikut ke index folder Storage-nya, lalu index Temp
+    # dipadatkan menjadi hanya file yang masih ada di Temp supaya tidak tumbuh terus
+    with _hash_index_lock:
+        hashes = _cached_hash_index(source_dir)
+        moved = [(name, hashes[name]) for name in files if name in hashes]
+        if moved:
+            with open(os.path.join(dest_dir, HASH_INDEX_NAME), "a") as f:
+                f.writelines(f"{digest}  {name}\n" for name, digest in moved)
+        if hashes:
+            _rewrite_index_file(source_dir, HASH_INDEX_NAME, [
+                f"{digest}  {name}\n" for name, digest in hashes.items()
+                if os.path.isfile(os.path.join(source_dir, name))
+            ])
+        _hash_index_cache.pop(source_dir, None)
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def save_upload_stream(stream, target_dir, filename, expected_sha256=None):
+    """Tulis stream ke target_dir per chunk sambil menghitung sha256. Mengembalikan entri manifest.
+
+    File ditulis ke .nama.part lalu di-rename, supaya classify tidak pernah membaca file setengah jadi.
+    Kiriman ulang dari Pi (nama dan isi sama dengan file yang sudah ada) tidak disimpan dua kali.
+    Nama baru dengan isi yang sudah dikenal tetap disimpan sebagai crop sendiri; hasilnya nanti
+    diambil dari cache hasil tanpa masuk model lagi."""
+    save_path = os.path.join(target_dir, filename)
+    part_path = os.path.join(target_dir, f".{filename}.part")
+    digest = hashlib.sha256()
+    size = 0
+    with open(part_path, "wb") as f:
+        while True:
+            chunk = stream.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            f.write(chunk)
+            size += len(chunk)
+
+    entry = {"file": filename, "size": size, "sha256": digest.hexdigest(), "status": "ok"}
+    if expected_sha256 and expected_sha256.lower() != entry["sha256"]:
+        os.remove(part_path)
+        entry["status"] = "checksum_mismatch"
+        return entry
+
+    with _hash_index_lock:
+        if _cached_hash_index(target_dir).get(filename) == entry["sha256"] and os.path.isfile(save_path):
+            os.remove(part_path)
+            entry["status"] = "duplicate"
+            return entry
+        os.replace(part_path, save_path)
+        with open(os.path.join(target_dir, HASH_INDEX_NAME), "a") as f:
+            f.write(f"{entry['sha256']}  {filename}\n")
+    pipeline_enqueue(target_dir, filename, entry["sha256"])
+    return entry
+
 
 @app.route('/upload-image', methods=['POST'])
 def upload_image():
@@ -39,31 +1038,132 @@ def upload_image():
     if file.filename == '':
         return 'No selected file', 400
 
-    save_path = os.path.join(TEMP_DIR, file.filename)
-    file.save(save_path)
-    return f'Uploaded {file.filename}', 200
+    target_dir = _upload_target_dir()
+    if target_dir is None:
+        return 'Capture not found', 404
+
+    filename = _safe_upload_name(file.filename)
+    if filename is None:
+        return 'Invalid file name', 400
+
+    entry = save_upload_stream(file.stream, target_dir, filename, request.form.get('sha256'))
+    if entry["status"] == "checksum_mismatch":
+        return 'Checksum mismatch', 400
+    if entry["status"] == "duplicate":
+        return f'{filename} already uploaded, skipped', 200
+    return f'Uploaded {filename}', 200
+
+
+def _iter_archive_members(content_type):
+    # (nama, stream) per file dari body zip/tar. Tar dibaca langsung dari stream request;
+    # zip butuh central directory di akhir file, jadi body di-spool dulu per chunk.
+    if content_type in ("application/zip", "application/x-zip-compressed"):
+        spool = tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_MAX_BYTES)
+        shutil.copyfileobj(request.stream, spool, UPLOAD_CHUNK_SIZE)
+        spool.seek(0)
+        with spool, zipfile.ZipFile(spool) as archive:
+            for info in archive.infolist():
+                if not info.is_dir():
+                    with archive.open(info) as member:
+                        yield info.filename, member
+        return
+
+    with tarfile.open(fileobj=request.stream, mode="r|*") as archive:
+        for info in archive:
+            if info.isfile():
+                yield info.name, archive.extractfile(info)
+
+
+@app.route('/upload-batch', methods=['POST'])
+def upload_batch():
+    """Banyak file dalam satu request: multipart (field 'files' berulang) atau body zip/tar.
+
+    Checksum sha256 opsional per file: field form 'checksums' atau header X-Checksums, JSON {nama: hex}."""
+    target_dir = _upload_target_dir()
+    if target_dir is None:
+        return jsonify({"error": "Capture tidak ditemukan."}), 404
+
+    try:
+        checksums = json.loads(request.headers.get('X-Checksums') or request.form.get('checksums') or "{}")
+    except ValueError:
+        return jsonify({"error": "Checksums harus berupa JSON {nama_file: sha256}."}), 400
+
+    content_type = (request.mimetype or "").lower()
+    if content_type == "multipart/form-data":
+        members = ((file.filename, file.stream) for file in request.files.getlist('files'))
+    elif content_type in ("application/zip", "application/x-zip-compressed", "application/x-tar",
+                          "application/gzip", "application/x-gzip", "application/octet-stream"):
+        members = _iter_archive_members(content_type)
+    else:
+        return jsonify({"error": "Gunakan multipart/form-data, application/zip, atau application/x-tar."}), 415
 
-def move_segmented_images_internal(timestamp):
+    manifest = []
+    try:
+        for name, stream in members:
+            filename = _safe_upload_name(name)
+            if filename is None:
+                manifest.append({"file": name, "status": "invalid_name"})
+                continue
+            manifest.append(save_upload_stream(stream, target_dir, filename, checksums.get(filename)))
+    except (zipfile.BadZipFile, tarfile.TarError) as e:
+        return jsonify({"error": f"Arsip tidak valid: {e}", "files": manifest}), 400
+
+    if not manifest:
+        return jsonify({"error": "Tidak ada file yang diunggah."}), 400
+
+    failed = [entry for entry in manifest if entry["status"] not in ("ok", "duplicate")]
+    duplicates = [entry for entry in manifest if entry["status"] == "duplicate"]
+    return jsonify({
+        "jumlah_file": len(manifest) - len(failed) - len(duplicates),
+        "duplikat": len(duplicates),
+        "gagal": len(failed),
+        "files": manifest
+    }), 200 if not failed else 422
+
+def move_segmented_images_internal(timestamp, source_dir=None, files=None):
     dest_dir = os.path.join(STORAGE_DIR, timestamp)
+
+    # Sesi staging: rename satu kali (atomic di filesystem yang sama)
+    if source_dir and source_dir != TEMP_DIR:
+        moved_files = list_source_files(source_dir)
+        # Timestamp dari reserve_capture_time, jadi folder tujuan belum ada
+        os.rename(source_dir, dest_dir)
+        with _hash_index_lock:
+            _hash_index_cache.pop(source_dir, None)
+        storage_index_add(timestamp)
+        invalidate_result_cache()
+        return {
+            "message": "Semua gambar berhasil dipindahkan.",
+            "jumlah_file": len(moved_files),
+            "folder_baru": dest_dir,
+            "files": moved_files
+        }
+
     os.makedirs(dest_dir, exist_ok=True)
+    storage_index_add(timestamp)
 
     moved_files = []
-    for filename in os.listdir(TEMP_DIR):
+    for filename in (files if files is not None else os.listdir(TEMP_DIR)):
         source_path = os.path.join(TEMP_DIR, filename)
         dest_path = os.path.join(dest_dir, filename)
 
         if os.path.isfile(source_path):
             shutil.move(source_path, dest_path)
             moved_files.append(filename)
+    _move_hash_entries(TEMP_DIR, dest_dir, moved_files)
+    prune_classified_index(TEMP_DIR)
 
-    # Hapus sisa isi folder TEMP tanpa menghapus foldernya sendiri
-    for leftover in os.listdir(TEMP_DIR):
+    # Hapus sisa isi folder TEMP tanpa menghapus foldernya sendiri. Jika daftar file run diketahui,
+    # file yang datang setelah run dimulai dibiarkan untuk run berikutnya.
+    for leftover in ([] if files is not None else os.listdir(TEMP_DIR)):
         path = os.path.join(TEMP_DIR, leftover)
         if os.path.isfile(path):
             os.remove(path)
         elif os.path.isdir(path):
             shutil.rmtree(path)
 
+    invalidate_result_cache()
+
     return {
         "message": "Semua gambar berhasil dipindahkan.",
         "jumlah_file": len(moved_files),
@@ -86,112 +1186,683 @@ def move_segmented_images_internal(timestamp):
         "files": moved_files
     }
 
-@app.route('/classify', methods=['GET'])
-def classify_chili_route():
-    model = YOLO(MODEL_PATH)
+def lookup_image_cache(cursor, hashes, model_version):
+    """{sha256: (pred_classes, confidences)} dari cache hasil untuk versi model yang sama."""
+    unique = sorted(set(hashes))
+    if not unique or model_version is None:
+        return {}
+    placeholders = ", ".join(["%s"] * len(unique))
+    cursor.execute(f"""
+        SELECT sha256, pred_class_1, conf_1, pred_class_2, conf_2, pred_class_3, conf_3
+        FROM chili_image_cache_v1
+        WHERE model_version = %s AND sha256 IN ({placeholders})
+    """, (model_version, *unique))
+    return {
+        row[0]: ([row[1], row[3], row[5]], [float(row[2]), float(row[4]), float(row[6])])
+        for row in cursor.fetchall()
+    }
+
+
+def is_crop_image(filename):
+    # Crop cabai yang diklasifikasi; gambar "full" hanya disimpan
+    return filename.lower().endswith(('.png', '.jpg', '.jpeg')) and 'full' not in filename.lower()
+
+
+# Pool decode crop, dipakai bersama oleh /classify dan pipeline
+_decode_executor = ThreadPoolExecutor(max_workers=DECODE_WORKERS)
+
+
+def prepare_batch(cursor, source_dir, files, hashes, model_version, timings):
+    """Tahap pertama satu batch: cek cache hasil, lalu kirim crop yang belum ada di cache ke pool
+    decode tanpa menunggu hasilnya. Isi identik dalam satu batch hanya di-decode sekali."""
+    with stage_timer(timings, "cache_lookup"):
+        top3_by_hash = lookup_image_cache(cursor, hashes, model_version)
+    missing = {}
+    for image_file, image_hash in zip(files, hashes):
+        if image_hash not in top3_by_hash:
+            missing.setdefault(image_hash, image_file)
+
+    model = None
+    decoding = {}
+    if missing:
+        with stage_timer(timings, "model_load"):
+            model = get_model()
+            imgsz = get_model_imgsz(model)
+        decoding = {
+            image_hash: _decode_executor.submit(load_crop, os.path.join(source_dir, image_file), imgsz)
+            for image_hash, image_file in missing.items()
+        }
+    return {
+        "hashes": hashes,
+        "model_version": model_version,
+        "top3_by_hash": top3_by_hash,
+        "cache_hits": sum(1 for h in hashes if h in top3_by_hash),
+        "model": model,
+        "decoding": decoding
+    }
+
+
+def finish_batch(cursor, batch, timings):
+    """Tahap kedua: tunggu hasil decode, forward pass, lalu simpan prediksi baru ke cache hasil.
+
+    Mengembalikan (top3 per file, jumlah cache hit)."""
+    top3_by_hash = batch["top3_by_hash"]
+    decoding = batch["decoding"]
+    if decoding:
+        # Hanya waktu tunggu di thread inferensi; decode sendiri berjalan paralel di _decode_executor
+        with stage_timer(timings, "decode_wait"):
+            images = [future.result() for future in decoding.values()]
+        # Hanya forward pass yang dikunci (predictor ultralytics tidak thread-safe); DB, file Results dan
+        # stream tiap run tetap berjalan paralel. InferenceSession ONNX Runtime aman dipanggil paralel.
+        model_lock = nullcontext() if isinstance(batch["model"], OnnxClassifier) else _model_lock
+        with stage_timer(timings, "predict"), model_lock:
+            predicted = dict(zip(decoding, predict_top3_batch(batch["model"], images)))
+        top3_by_hash.update(predicted)
+        with stage_timer(timings, "db_write"):
+            cursor.executemany(INSERT_IMAGE_CACHE_SQL, [
+                (image_hash, batch["model_version"],
+                 pred_classes[0], confidences[0],
+                 pred_classes[1], confidences[1],
+                 pred_classes[2], confidences[2])
+                for image_hash, (pred_classes, confidences) in predicted.items()
+            ])
+    return [top3_by_hash[h] for h in batch["hashes"]], batch["cache_hits"]
+
+
+def predict_with_cache(cursor, source_dir, files, hashes, model_version, timings):
+    """Top-3 per file lewat cache hasil: hanya isi yang belum pernah diklasifikasi yang masuk model.
+
+    Mengembalikan (top3 per file, jumlah cache hit)."""
+    return finish_batch(cursor, prepare_batch(cursor, source_dir, files, hashes, model_version, timings), timings)
+
+
+def prefetch_batches(cursor, source_dir, image_files, known_hashes, model_version, timings):
+    """Bagi image_files per CLASSIFY_BATCH_SIZE dan hasilkan (batch_files, batch) berurutan, dengan
+    PREFETCH_BATCHES batch berikutnya sudah di-hash dan sedang di-decode di pool selama batch
+    saat ini masuk model."""
+    pending = deque()
+    for start in range(0, len(image_files), CLASSIFY_BATCH_SIZE):
+        batch_files = image_files[start:start + CLASSIFY_BATCH_SIZE]
+        with stage_timer(timings, "hash"):
+            hashes = [known_hashes.get(f) or file_sha256(os.path.join(source_dir, f)) for f in batch_files]
+        pending.append((batch_files, prepare_batch(cursor, source_dir, batch_files, hashes, model_version, timings)))
+        if len(pending) > PREFETCH_BATCHES:
+            yield pending.popleft()
+    while pending:
+        yield pending.popleft()
+
+
+def restore_moved_images(timestamp, source_dir):
+    # Kebalikan move_segmented_images_internal untuk run yang gagal di-commit: isi Storage/<timestamp>
+    # (sebagian atau seluruhnya) dikembalikan ke folder sumbernya
+    dest_dir = os.path.join(STORAGE_DIR, timestamp)
+    if not os.path.isdir(dest_dir):
+        return
+    if source_dir != TEMP_DIR and not os.path.exists(source_dir):
+        os.rename(dest_dir, source_dir)
+    else:
+        # Index di folder tujuan (.sha256sums) tidak dikembalikan supaya tidak menimpa index Temp;
+        # hash file yang kembali cukup dihitung ulang saat classify berikutnya
+        for filename in os.listdir(dest_dir):
+            if not filename.startswith("."):
+                shutil.move(os.path.join(dest_dir, filename), os.path.join(source_dir, filename))
+        shutil.rmtree(dest_dir)
+    storage_index_remove(timestamp)
+
+
+def quarantine_capture(source_dir):
+    # Capture yang gagal dipindahkan: keluarkan dari Staging/ supaya pending_captures() tidak
+    # menyelesaikannya lagi. Isinya tetap utuh di Staging/failed/ untuk diperiksa manual.
+    os.makedirs(STAGING_FAILED_DIR, exist_ok=True)
+    target = os.path.join(STAGING_FAILED_DIR, os.path.basename(source_dir))
+    os.rename(source_dir, target)
+    print(f"Capture {os.path.basename(source_dir)} disisihkan ke {target}")
+
+
+def classify_temp_images(job=None):
+    """Inti dari /classify. Mengembalikan (payload, status_code) dan mengisi progres job jika ada."""
     os.makedirs(RESULTS_DIR, exist_ok=True)
 
-    image_files = [f for f in os.listdir(TEMP_DIR)
-                   if f.lower().endswith(('.png', '.jpg', '.jpeg')) and 'full' not in f.lower()]
-    if not image_files:
-        return jsonify([{"error": "Tidak ada file gambar di folder temp."}]), 404
-
-    # Koneksi ke database
-    db = mysql.connector.connect(
-        host=os.getenv("DB_HOST"),
-        user=os.getenv("DB_USER"),
-        password=os.getenv("DB_PASS"),
-        database=os.getenv("DB_NAME")
-    )
-    cursor = db.cursor()
+    source_dir = (job or {}).get("source_dir") or TEMP_DIR
+    if not os.path.isdir(source_dir):
+        return [{"error": "Capture tidak ditemukan."}], 404
 
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS chili_predictions_v1 (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            tanggal DATE,
-            waktu TIME,
-            image VARCHAR(255),
-            pred_class_1 VARCHAR(100),
-            conf_1 FLOAT,
-            pred_class_2 VARCHAR(100),
-            conf_2 FLOAT,
-            pred_class_3 VARCHAR(100),
-            conf_3 FLOAT
-        )
-    """)
+    # Daftar file diambil sekali di awal; upload yang datang setelahnya tidak ikut run ini
+    source_files = list_source_files(source_dir)
+    image_files = [f for f in source_files if is_crop_image(f)]
+    if not image_files:
+        return [{"error": "Tidak ada file gambar di folder temp."}], 404
 
-    now = datetime.now()
+    now = reserve_capture_time()
     tanggal = now.strftime("%Y-%m-%d")
     waktu = now.strftime("%H-%M-%S")  # Format untuk nama folder & file
     waktu_db = waktu.replace("-", ":")  # Format waktu untuk database (HH:MM:SS)
 
+    run_start = perf_counter()
+    # Durasi dikumpulkan di dict milik run ini; job["timings"] hanya diganti dengan salinan utuh
+    # (per batch dan di akhir), sehingga /jobs/<id> tidak pernah mengiterasi dict yang sedang diubah
+    timings = {}
+    if job:
+        job["images_total"] = len(image_files)
+        job["timestamp"] = f"{tanggal}_{waktu}"
+        job["files"] = source_files
+
+    # Mode stream: hasil dikirim per batch lewat job["events"] dan tidak ditumpuk di memori
+    stream = job is not None and job.get("events") is not None
     results_list = []
+    images_done = 0
+    class_totals = defaultdict(lambda: [0, 0.0])  # pred_class_1 -> [jumlah, total_conf]
 
-    for image_file in image_files:
-        image_path = os.path.join(TEMP_DIR, image_file)
-        img = Image.open(image_path)
+    output_filename = f"results_{tanggal}_{waktu}.txt"
+    output_path = os.path.join(RESULTS_DIR, output_filename)
 
-        results = model.predict(img, verbose=False)[0]
+    # Hasil ditulis bertahap per batch: baris DB dalam satu transaksi yang di-commit di akhir run,
+    # dan file Results ditulis elemen demi elemen dengan format yang sama seperti json.dump(indent=4)
+    move_started = move_failed = False
+    with get_db() as db, open(output_path, "w") as results_file:
+        cursor = db.cursor()
+        try:
+            results_file.write("[\n")
+
+            # Model baru dimuat saat ada gambar yang belum ada di cache hasil
+            model_version = get_model_version(_model_signature())
+            timings["model_load"] = 0.0
+            known_hashes = read_hash_index(source_dir)
+            cache_hits = 0
+
+            # Catat run lebih dulu supaya setiap baris prediksi menunjuk folder Storage-nya secara pasti
+            cursor.execute(INSERT_RUN_SQL, (tanggal, waktu_db, f"{tanggal}_{waktu}", model_version))
+            run_id = cursor.lastrowid
+
+            timings["inference"] = 0.0
+            timings["db_write"] = 0.0
+            batch_latency = []
+            batches = prefetch_batches(cursor, source_dir, image_files, known_hashes, model_version, timings)
+            for batch_files, prepared in batches:
+                batch_start = perf_counter()
+                top3_batch, batch_hits = finish_batch(cursor, prepared, timings)
+                cache_hits += batch_hits
+
+                latency = {
+                    "batch": len(batch_latency) + 1,
+                    "images": len(batch_files),
+                    "cache_hits": batch_hits,
+                    "latency_ms": round((perf_counter() - batch_start) * 1000, 2)
+                }
+                batch_latency.append(latency)
+                timings["inference"] += perf_counter() - batch_start
+
+                prediction_rows = []
+                batch_results = []
+                for image_file, (pred_classes, confidences) in zip(batch_files, top3_batch):
+                    prediction_rows.append((
+                        tanggal, waktu_db, image_file,
+                        pred_classes[0], confidences[0],
+                        pred_classes[1], confidences[1],
+                        pred_classes[2], confidences[2],
+                        run_id
+                    ))
+
+                    batch_results.append({
+                        "tanggal": tanggal,
+                        "waktu": waktu_db,
+                        "image": image_file,
+                        "top3": [
+                            {"class": pred_classes[0], "confidence": round(confidences[0], 4)},
+                            {"class": pred_classes[1], "confidence": round(confidences[1], 4)},
+                            {"class": pred_classes[2], "confidence": round(confidences[2], 4)},
+                        ]
+                    })
+
+                stage_start = perf_counter()
+                cursor.executemany(INSERT_PREDICTION_SQL, prediction_rows)
+                timings["db_write"] += perf_counter() - stage_start
+
+                for row in prediction_rows:
+                    class_totals[row[3]][0] += 1
+                    class_totals[row[3]][1] += row[4]
+
+                with stage_timer(timings, "results_write"):
+                    for item in batch_results:
+                        if images_done:
+                            results_file.write(",\n")
+                        results_file.write(textwrap.indent(json.dumps(item, indent=4), "    "))
+                        images_done += 1
+
+                if stream:
+                    for item in batch_results:
+                        job["events"].put({"type": "result", **item})
+                    job["events"].put({"type": "batch", **latency})
+                else:
+                    results_list.extend(batch_results)
+
+                if job:
+                    job["images_done"] = images_done
+                    job["timings"] = dict(timings)
+
+            results_file.write("\n]")
+
+            # Agregat per hari dan per run diperbarui di transaksi yang sama dengan prediksinya
+            cursor.executemany(UPSERT_STATS_DAILY_SQL, [
+                (tanggal, pred_class, jumlah, total_conf) for pred_class, (jumlah, total_conf) in class_totals.items()
+            ])
+            cursor.executemany(UPSERT_STATS_RUN_SQL, [
+                (run_id, pred_class, jumlah, total_conf) for pred_class, (jumlah, total_conf) in class_totals.items()
+            ])
+
+            cursor.execute(
+                "UPDATE chili_runs_v1 SET jumlah_gambar = %s, duration = %s WHERE id = %s",
+                (images_done, round(perf_counter() - run_start, 4), run_id)
+            )
+
+            # Gambar dipindahkan sebelum commit, dengan timestamp yang sama dengan database. Jika
+            # pemindahan gagal, transaksi di bawah di-rollback sehingga tidak ada run yang menunjuk
+            # folder Storage yang tidak ada.
+            move_started = True
+            try:
+                with stage_timer(timings, "move"):
+                    move_segmented_images_internal(timestamp=f"{tanggal}_{waktu}", source_dir=source_dir,
+                                                   files=source_files)
+            except OSError:
+                move_failed = True
+                raise
+
+            # Semua baris satu run masuk dalam satu commit: masuk semua atau tidak sama sekali
+            stage_start = perf_counter()
+            db.commit()
+            timings["db_write"] += perf_counter() - stage_start
+            invalidate_result_cache()
+        except Exception as e:
+            # Run gagal: batalkan transaksi dan buang file Results yang baru setengah jadi
+            db.rollback()
+            results_file.close()
+            os.remove(output_path)
+            if move_started:
+                try:
+                    restore_moved_images(f"{tanggal}_{waktu}", source_dir)
+                    if move_failed and source_dir != TEMP_DIR:
+                        quarantine_capture(source_dir)
+                except OSError as restore_error:
+                    print(f"Gagal mengembalikan gambar run {tanggal}_{waktu}: {restore_error}")
+            if isinstance(e, mysql.connector.Error):
+                return {"error": f"Gagal menyimpan hasil klasifikasi: {e}"}, 500
+            raise
+        finally:
+            cursor.close()
+
+    for stage in timings:
+        timings[stage] = round(timings[stage], 4)
+    if job:
+        job["timings"] = dict(timings)
+
+    payload = {
+        "message": "Klasifikasi selesai. Gambar akan segera dipindahkan otomatis. proses pemindahan berlangsung sekitar 3 menit, harap ditunggu.",
+        "auto_move_time": "0 detik",
+        "cache_hits": cache_hits,
+        "batch_latency": batch_latency
+    }
+    if stream:
+        payload["jumlah_gambar"] = images_done
+    else:
+        payload = {"classification_result": results_list, **payload}
+    return payload, 200
 
-        names = model.model.names
-        probs = results.probs.data
-        top_indices = probs.argsort(descending=True)[:3]
 
-        pred_classes = [names[int(i)] for i in top_indices]
-        confidences = [float(probs[int(i)]) for i in top_indices]
+# Antrian job klasifikasi. Job dari sesi capture berbeda boleh jalan bersamaan (CLASSIFY_WORKERS),
+# sedangkan job yang memakai folder Temp bersama dijalankan satu per satu lewat _temp_dir_lock.
+JOB_HISTORY_LIMIT = int(os.getenv("JOB_HISTORY_LIMIT", "50"))
+CLASSIFY_WORKERS = int(os.getenv("CLASSIFY_WORKERS", "1"))
 
-        cursor.execute("""
-            INSERT INTO chili_predictions_v1 (
-                tanggal, waktu, image,
-                pred_class_1, conf_1,
-                pred_class_2, conf_2,
-                pred_class_3, conf_3
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """, (
-            tanggal, waktu_db, image_file,
-            pred_classes[0], confidences[0],
-            pred_classes[1], confidences[1],
-            pred_classes[2], confidences[2]
-        ))
-        db.commit()
-
-        results_list.append({
-            "tanggal": tanggal,
-            "waktu": waktu_db,
-            "image": image_file,
-            "top3": [
-                {"class": pred_classes[0], "confidence": round(confidences[0], 4)},
-                {"class": pred_classes[1], "confidence": round(confidences[1], 4)},
-                {"class": pred_classes[2], "confidence": round(confidences[2], 4)},
-            ]
-        })
+_job_queue = queue.Queue()
+_jobs = OrderedDict()
+_jobs_lock = threading.Lock()
+_job_workers = []
+_source_dir_locks = defaultdict(threading.Lock)
 
-    cursor.close()
-    db.close()
 
-    output_filename = f"results_{tanggal}_{waktu}.txt"
-    output_path = os.path.join(RESULTS_DIR, output_filename)
-    with open(output_path, "w") as f:
-        json.dump(results_list, f, indent=4)
+def _run_job(job):
+    # Job untuk folder sumber yang sama (Temp, atau capture yang dikirim dua kali) tidak boleh tumpang
+    # tindih; job kedua untuk capture yang sudah dipindahkan akan berakhir 404
+    with _jobs_lock:
+        source_lock = _source_dir_locks[job["source_dir"]]
+    with source_lock:
+        _run_job_locked(job)
+
+
+def _run_job_locked(job):
+    job["status"] = "running"
+    job["started_at"] = datetime.now().isoformat(timespec="seconds")
+    start = perf_counter()
+    try:
+        # Gambar sudah dipindahkan ke Storage di dalam classify_temp_images sebelum commit,
+        # jadi status 200 berarti run tercatat dan foldernya ada
+        job["result"], job["status_code"] = classify_temp_images(job)
+        job["status"] = "finished" if job["status_code"] == 200 else "failed"
+        if job["status_code"] == 200:
+            print("Gambar otomatis dipindahkan setelah klasifikasi.")
+            _thumbnail_executor.submit(_generate_thumbnails_timed, job["timestamp"])
+    except Exception as e:
+        job["result"], job["status_code"] = {"error": str(e)}, 500
+        job["status"] = "failed"
+    finally:
+        # Semua durasi ditulis sebelum done di-set; pembaca setelah done tidak bersaing dengan worker
+        job["timings"] = {**job["timings"], "total": round(perf_counter() - start, 4)}
+        job["finished_at"] = datetime.now().isoformat(timespec="seconds")
+        job["done"].set()
+        if job["events"] is not None:
+            job["events"].put({"type": "done", "status_code": job["status_code"], "result": job["result"]})
+            job["events"].put(None)
 
-    # Panggil fungsi pemindahan dengan timestamp yang sama, supaya folder storage sama waktunya dengan database
-    def delayed_move():
-        move_segmented_images_internal(timestamp=f"{tanggal}_{waktu}")
-        print("Gambar otomatis dipindahkan setelah klasifikasi.")
+    record_stages("smartfarm_classify_stage_seconds", job["timings"])
 
-    timer = threading.Timer(0, delayed_move)  # 0 detik (langsung)
-    timer.start()
 
+def _generate_thumbnails_timed(folder):
+    start = perf_counter()
+    generate_folder_thumbnails(folder)
+    observe("smartfarm_classify_stage_seconds", perf_counter() - start, stage="thumbnails")
+
+
+def _job_worker_loop():
+    while True:
+        job = _job_queue.get()
+        try:
+            _run_job(job)
+        except Exception as e:
+            # Thread worker harus tetap hidup untuk job berikutnya
+            print(f"Job {job['id']} gagal: {e}")
+        finally:
+            _job_queue.task_done()
+
+
+def submit_classify_job(source, stream=False, capture_id=None):
+    job = {
+        "id": uuid.uuid4().hex,
+        "source": source,
+        "capture_id": capture_id,
+        "source_dir": os.path.join(STAGING_DIR, capture_id) if capture_id else TEMP_DIR,
+        "files": None,
+        "status": "queued",
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "started_at": None,
+        "finished_at": None,
+        "images_done": 0,
+        "images_total": None,
+        "timestamp": None,
+        "timings": {},
+        "result": None,
+        "status_code": None,
+        "done": threading.Event(),
+        "events": queue.Queue() if stream else None
+    }
+    with _jobs_lock:
+        _jobs[job["id"]] = job
+        # Buang job lama yang sudah selesai supaya riwayat tidak tumbuh terus
+        while len(_jobs) > JOB_HISTORY_LIMIT:
+            oldest_id, oldest = next(iter(_jobs.items()))
+            if not oldest["done"].is_set():
+                break
+            _jobs.pop(oldest_id)
+        _job_workers[:] = [worker for worker in _job_workers if worker.is_alive()]
+        while len(_job_workers) < CLASSIFY_WORKERS:
+            worker = threading.Thread(target=_job_worker_loop, daemon=True)
+            worker.start()
+            _job_workers.append(worker)
+    _job_queue.put(job)
+    return job
+
+
+def job_to_dict(job):
+    return {key: value for key, value in job.items() if key not in ("done", "events", "source_dir", "files")}
+
+
+def _requested_capture_id():
+    # capture_id dari query string atau body JSON; (capture_id, error_response)
+    data = request.get_json(silent=True) or {}
+    capture_id = request.args.get('capture_id') or data.get('capture_id')
+    if capture_id and get_capture_dir(capture_id) is None:
+        return None, (jsonify({"error": "Capture tidak ditemukan."}), 404)
+    return capture_id, None
+
+
+@app.route('/classify', methods=['GET'])
+def classify_chili_route():
+    # Mode sinkron lama: tetap lewat antrian, lalu tunggu hasilnya
+    capture_id, error = _requested_capture_id()
+    if error:
+        return error
+    job = submit_classify_job("manual", capture_id=capture_id)
+    job["done"].wait()
+    for stage, seconds in job["timings"].items():
+        if stage != "total":
+            add_server_timing(stage, seconds)
+    return jsonify(job["result"]), job["status_code"]
+
+
+@app.route('/classify', methods=['POST'])
+def classify_job_route():
+    capture_id, error = _requested_capture_id()
+    if error:
+        return error
+    job = submit_classify_job("api", capture_id=capture_id)
     return jsonify({
-        "classification_result": results_list,
-        "message": "Klasifikasi selesai. Gambar akan segera dipindahkan otomatis. proses pemindahan berlangsung sekitar 3 menit, harap ditunggu.",
-        "auto_move_time": "0 detik"
+        "job_id": job["id"],
+        "status": job["status"],
+        "status_url": f"/jobs/{job['id']}"
+    }), 202
+
+
+@app.route('/classify/stream', methods=['GET'])
+def classify_stream_route():
+    # NDJSON: satu baris JSON per gambar begitu batch-nya selesai, lalu ringkasan "done"
+    capture_id, error = _requested_capture_id()
+    if error:
+        return error
+    job = submit_classify_job("stream", stream=True, capture_id=capture_id)
+
+    def generate():
+        yield json.dumps({"type": "job", "job_id": job["id"]}) + "\n"
+        while True:
+            event = job["events"].get()
+            if event is None:
+                break
+            yield json.dumps(event) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job tidak ditemukan."}), 404
+    return jsonify(job_to_dict(job))
+
+
+# Mode pipeline (PIPELINE_MODE=1): setiap crop yang diunggah langsung masuk antrian inference.
+# Worker mengumpulkan file sampai PIPELINE_BATCH_SIZE atau PIPELINE_FLUSH_SECONDS, memprediksi
+# satu batch, lalu menyimpan hasilnya ke cache hasil (chili_image_cache_v1) dan mencatatnya di
+# .classified.jsonl folder upload. Run /classify (manual atau terjadwal) kemudian hanya menyelesaikan
+# capture: semua gambar sudah ada di cache, jadi tidak ada inference lagi, hanya insert DB dan pindah folder.
+PIPELINE_ENABLED = os.getenv("PIPELINE_MODE", "0") == "1"
+PIPELINE_BATCH_SIZE = int(os.getenv("PIPELINE_BATCH_SIZE", str(CLASSIFY_BATCH_SIZE)))
+PIPELINE_FLUSH_SECONDS = float(os.getenv("PIPELINE_FLUSH_SECONDS", "2"))
+# Capture tanpa upload baru selama ini (detik) ikut diselesaikan oleh run terjadwal
+CAPTURE_IDLE_SECONDS = int(os.getenv("CAPTURE_IDLE_SECONDS", "300"))
+CLASSIFIED_INDEX_NAME = ".classified.jsonl"
+
+_pipeline_queue = queue.Queue()
+_pipeline_lock = threading.Lock()
+_pipeline = {"thread": None, "batches": 0, "images": 0, "cache_hits": 0, "skipped": 0,
+             "errors": 0, "last_error": None, "last_flush": None}
+
+
+def pipeline_enqueue(source_dir, filename, sha256):
+    if not PIPELINE_ENABLED or not is_crop_image(filename):
+        return
+    with _pipeline_lock:
+        if _pipeline["thread"] is None or not _pipeline["thread"].is_alive():
+            _pipeline["thread"] = threading.Thread(target=_pipeline_loop, daemon=True)
+            _pipeline["thread"].start()
+    _pipeline_queue.put((source_dir, filename, sha256))
+
+
+def _pipeline_collect():
+    # Tunggu file pertama, lalu kumpulkan sampai batch penuh atau batas waktu habis
+    items = [_pipeline_queue.get()]
+    deadline = perf_counter() + PIPELINE_FLUSH_SECONDS
+    while len(items) < PIPELINE_BATCH_SIZE:
+        remaining = deadline - perf_counter()
+        if remaining <= 0:
+            break
+        try:
+            items.append(_pipeline_queue.get(timeout=remaining))
+        except queue.Empty:
+            break
+    return items
+
+
+def _pipeline_flush(items):
+    # File yang sudah dipindahkan (capture sudah diselesaikan lebih dulu) dilewati
+    by_dir = defaultdict(list)
+    for source_dir, filename, sha256 in items:
+        if os.path.isfile(os.path.join(source_dir, filename)):
+            by_dir[source_dir].append((filename, sha256))
+    skipped = len(items) - sum(len(files) for files in by_dir.values())
+
+    timings = {}
+    classified = {}
+    cache_hits = 0
+    with get_db() as db:
+        cursor = db.cursor()
+        try:
+            model_version = get_model_version(_model_signature())
+            for source_dir, files in by_dir.items():
+                names = [name for name, _ in files]
+                top3_batch, hits = predict_with_cache(cursor, source_dir, names,
+                                                      [h for _, h in files], model_version, timings)
+                cache_hits += hits
+                classified[source_dir] = list(zip(files, top3_batch))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            cursor.close()
+
+    with _hash_index_lock:
+        for source_dir, results in classified.items():
+            if not os.path.isdir(source_dir):
+                continue
+            with open(os.path.join(source_dir, CLASSIFIED_INDEX_NAME), "a") as f:
+                for (filename, sha256), (pred_classes, confidences) in results:
+                    f.write(json.dumps({
+                        "image": filename,
+                        "sha256": sha256,
+                        "top3": [{"class": c, "confidence": round(conf, 4)} for c, conf in zip(pred_classes, confidences)]
+                    }) + "\n")
+
+    record_stages("smartfarm_pipeline_stage_seconds", timings)
+    with _pipeline_lock:
+        _pipeline["batches"] += 1
+        _pipeline["images"] += len(items) - skipped
+        _pipeline["cache_hits"] += cache_hits
+        _pipeline["skipped"] += skipped
+        _pipeline["last_flush"] = datetime.now().isoformat(timespec="seconds")
+
+
+def _pipeline_loop():
+    while True:
+        items = _pipeline_collect()
+        try:
+            _pipeline_flush(items)
+        except Exception as e:
+            # Gambar yang gagal tetap akan diklasifikasi oleh run /classify berikutnya
+            with _pipeline_lock:
+                _pipeline["errors"] += 1
+                _pipeline["last_error"] = str(e)
+            print(f"Pipeline gagal memproses {len(items)} gambar: {e}")
+
+
+def read_classified_index(folder):
+    entries = {}
+    try:
+        with open(os.path.join(folder, CLASSIFIED_INDEX_NAME)) as f:
+            for line in f:
+                entry = json.loads(line)
+                entries[entry["image"]] = entry
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+def prune_classified_index(folder):
+    # Hasil pipeline di Temp untuk file yang sudah dipindahkan ke Storage tidak dibutuhkan lagi;
+    # tanpa ini file index Temp tumbuh terus dan dibaca ulang seluruhnya
+    with _hash_index_lock:
+        path = os.path.join(folder, CLASSIFIED_INDEX_NAME)
+        if not os.path.exists(path):
+            return
+        with open(path) as f:
+            lines = [line for line in f
+                     if line.strip() and os.path.isfile(os.path.join(folder, json.loads(line)["image"]))]
+        _rewrite_index_file(folder, CLASSIFIED_INDEX_NAME, lines)
+
+
+@app.route('/pipeline-status', methods=['GET'])
+def pipeline_status():
+    with _pipeline_lock:
+        status = {key: value for key, value in _pipeline.items() if key != "thread"}
+        status["running"] = _pipeline["thread"] is not None and _pipeline["thread"].is_alive()
+    status.update({
+        "enabled": PIPELINE_ENABLED,
+        "queued": _pipeline_queue.qsize(),
+        "batch_size": PIPELINE_BATCH_SIZE,
+        "flush_seconds": PIPELINE_FLUSH_SECONDS
     })
+    return jsonify(status)
+
+
+@app.route('/captures/<capture_id>', methods=['GET'])
+def get_capture(capture_id):
+    # Hasil sementara dari pipeline sebelum capture diselesaikan oleh /classify
+    capture_dir = get_capture_dir(capture_id)
+    if capture_dir is None:
+        return jsonify({"error": "Capture tidak ditemukan."}), 404
+    files = [f for f in list_source_files(capture_dir) if is_crop_image(f)]
+    classified = read_classified_index(capture_dir)
+    return jsonify({
+        "capture_id": capture_id,
+        "jumlah_gambar": len(files),
+        "jumlah_terklasifikasi": sum(1 for f in files if f in classified),
+        "results": [classified[f] for f in files if f in classified]
+    })
+
+
+def pending_captures():
+    # Capture di Staging yang berisi crop dan sudah tidak menerima upload selama CAPTURE_IDLE_SECONDS
+    captures = []
+    now = datetime.now().timestamp()
+    try:
+        names = sorted(os.listdir(STAGING_DIR))
+    except FileNotFoundError:
+        return []
+    for capture_id in names:
+        capture_dir = get_capture_dir(capture_id)
+        if capture_dir is None or now - os.stat(capture_dir).st_mtime < CAPTURE_IDLE_SECONDS:
+            continue
+        if any(is_crop_image(f) for f in list_source_files(capture_dir)):
+            captures.append(capture_id)
+    return captures
+
 
-    
 def run_classify():
-    with app.test_request_context():
-        return classify_chili_route()
+    # Dipakai scheduler: cukup masuk antrian, tidak menahan request /check-schedule.
+    # Selain Temp, capture yang tidak pernah di-/classify oleh chamber-nya juga diselesaikan di sini.
+    jobs = [submit_classify_job("scheduler", capture_id=capture_id) for capture_id in pending_captures()]
+    if any(is_crop_image(f) for f in list_source_files(TEMP_DIR)):
+        jobs.append(submit_classify_job("scheduler"))
+    return jobs
 
 #@app.route('/move', methods=['GET'])
 #def move_segmented_images_route():
@@ -199,6 +1870,7 @@ def run_classify():
 #    return jsonify(result)
 
 @app.route('/get-data', methods=['POST'])
+@cached_json_response("get-data")
 def get_data():
     data = request.get_json(silent=True) or {}
     tanggal = data.get('tanggal')
@@ -207,58 +1879,79 @@ def get_data():
     pred_class_1 = data.get('pred_class_1')
     pred_class_2 = data.get('pred_class_2')
     pred_class_3 = data.get('pred_class_3')
+    # ?image_mode=url mengembalikan URL /images/... alih-alih data URI base64
+    image_mode = request.args.get('image_mode', 'base64')
+    # ?size=<px> mengirim thumbnail alih-alih gambar asli
+    thumb_size = request.args.get('size', type=int)
+    if thumb_size and thumb_size not in THUMBNAIL_SIZES:
+        return jsonify({"error": f"Ukuran thumbnail harus salah satu dari {THUMBNAIL_SIZES}"}), 400
 
-    db = mysql.connector.connect(
-        host=os.getenv("DB_HOST"),
-        user=os.getenv("DB_USER"),
-        password=os.getenv("DB_PASS"),
-        database=os.getenv("DB_NAME")
-    )
-
-    cursor = db.cursor(dictionary=True)
-
-    # Jika tidak ada tanggal, ambil tanggal dan waktu terbaru
-    if not tanggal:
-        cursor.execute("""
-            SELECT tanggal, waktu FROM chili_predictions_v1
-            ORDER BY tanggal DESC, waktu DESC LIMIT 1
-        """)
-        result = cursor.fetchone()
-        if result:
-            tanggal = result['tanggal']
-            waktu = result['waktu']
-
-    # Bangun query dinamis berdasarkan filter yang ada
-    query = """
-        SELECT tanggal, waktu, image, pred_class_1, pred_class_2, pred_class_3
-        FROM chili_predictions_v1
-        WHERE 1=1
-    """
-    params = []
-
-    if tanggal:
-        query += " AND tanggal = %s"
-        params.append(tanggal)
-    if waktu:
-        query += " AND waktu = %s"
-        params.append(waktu)
-    if image:
-        query += " AND image LIKE %s"
-        params.append(f"%{image}%")
-    if pred_class_1:
-        query += " AND pred_class_1 = %s"
-        params.append(pred_class_1)
-    if pred_class_2:
-        query += " AND pred_class_2 = %s"
-        params.append(pred_class_2)
-    if pred_class_3:
-        query += " AND pred_class_3 = %s"
-        params.append(pred_class_3)
-
-    query += " ORDER BY waktu DESC LIMIT 30"
-
-    cursor.execute(query, tuple(params))
-    rows = cursor.fetchall()
+    try:
+        page_size = get_page_size(data.get('limit'))
+        after = keyset_params(data['cursor']) if data.get('cursor') else None
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    timings = {"db": 0.0, "folder_resolve": 0.0, "encode": 0.0}
+    stage_start = perf_counter()
+
+    # Koneksi dikembalikan ke pool sebelum proses file gambar per baris
+    with get_db() as db:
+        cursor = db.cursor(dictionary=True)
+
+        # Jika tidak ada tanggal, ambil tanggal dan waktu terbaru
+        if not tanggal:
+            cursor.execute("""
+                SELECT tanggal, waktu FROM chili_predictions_v1
+                ORDER BY tanggal DESC, waktu DESC LIMIT 1
+            """)
+            result = cursor.fetchone()
+            if result:
+                tanggal = result['tanggal']
+                waktu = result['waktu']
+
+        # Bangun query dinamis berdasarkan filter yang ada
+        query = """
+            SELECT p.id, p.tanggal, p.waktu, p.image, p.pred_class_1, p.pred_class_2, p.pred_class_3, r.folder
+            FROM chili_predictions_v1 p
+            LEFT JOIN chili_runs_v1 r ON r.id = p.run_id
+            WHERE 1=1
+        """
+        params = []
+
+        if tanggal:
+            query += " AND p.tanggal = %s"
+            params.append(tanggal)
+        if waktu:
+            query += " AND p.waktu = %s"
+            params.append(waktu)
+        if image:
+            query += " AND p.image LIKE %s"
+            params.append(f"%{image}%")
+        if pred_class_1:
+            query += " AND p.pred_class_1 = %s"
+            params.append(pred_class_1)
+        if pred_class_2:
+            query += " AND p.pred_class_2 = %s"
+            params.append(pred_class_2)
+        if pred_class_3:
+            query += " AND p.pred_class_3 = %s"
+            params.append(pred_class_3)
+        if after:
+            query += " AND " + keyset_clause("p.")
+            params.extend(after)
+
+        # Ambil satu baris ekstra untuk mengetahui apakah masih ada halaman berikutnya
+        query += " ORDER BY p.tanggal DESC, p.waktu DESC, p.id DESC LIMIT %s"
+        params.append(page_size + 1)
+
+        cursor.execute(query, tuple(params))
+        rows = cursor.fetchall()
+        cursor.close()
+    timings["db"] = perf_counter() - stage_start
+
+    next_cursor = encode_cursor(rows[page_size - 1]) if len(rows) > page_size else None
+    rows = rows[:page_size]
 
     results = []
 
@@ -285,35 +1978,36 @@ def get_data():
             waktu_str = str(waktu_raw)
             waktu_folder = waktu_str.replace(":", "-")
 
-        # Buat nama folder dan path gambar
-        jam_menit = waktu_folder[:5]  # "HH-MM"
-        jam, menit = map(int, jam_menit.split('-')) 
-
-        prefixes = []
-        prefixes.append(f"{tanggal_str}_{jam:02}-{menit:02}")
-
-        if menit == 59:
-            jam_plus = (jam + 1) % 24
-            menit_plus = 0
-        else:
-            jam_plus = jam
-            menit_plus = menit + 1
-
-        prefixes.append(f"{tanggal_str}_{jam_plus:02}-{menit_plus:02}")
-
         image_filename = row['image']
-
-        matching_folders = [f for f in os.listdir(STORAGE_DIR)
-                            if any(f.startswith(prefix) for prefix in prefixes)
-                            and os.path.isdir(os.path.join(STORAGE_DIR, f))]
+        stage_start = perf_counter()
+        if row.get('folder'):
+            # Baris baru menyimpan folder Storage-nya lewat tabel run
+            matching_folders = [row['folder']]
+        else:
+            # Baris lama tanpa run_id: folder capture dibuat sesaat setelah insert,
+            # jadi cari di menit yang sama atau menit berikutnya
+            menit_awal = datetime.strptime(f"{tanggal_str} {waktu_folder[:5]}", "%Y-%m-%d %H-%M")
+            matching_folders = find_storage_folders(menit_awal, menit_awal + timedelta(minutes=2))
 
         if matching_folders:
             selected_folder = matching_folders[0]
             image_path = os.path.join(STORAGE_DIR, selected_folder, image_filename)
         else:
             image_path = None
-
-        if image_path and os.path.exists(image_path):
+        timings["folder_resolve"] += perf_counter() - stage_start
+
+        stage_start = perf_counter()
+        image_url = None
+        if image_path and os.path.exists(image_path) and image_mode == "url":
+            # Mode URL: browser mengambil gambar lewat /images dan bisa memakai cache HTTP
+            if thumb_size:
+                image_url = url_for('get_thumbnail_image', size=thumb_size, filename=f"{selected_folder}/{image_filename}")
+            else:
+                image_url = url_for('get_storage_image', filename=f"{selected_folder}/{image_filename}")
+            image_data = None
+        elif image_path and os.path.exists(image_path):
+            if thumb_size:
+                image_path = get_thumbnail(selected_folder, image_filename, thumb_size) or image_path
             try:
                 with open(image_path, 'rb') as img_file:
                     raw_data = img_file.read()
@@ -327,71 +2021,224 @@ def get_data():
                 image_data = None
         else:
             image_data = None
+        timings["encode"] += perf_counter() - stage_start
 
         results.append({
             "tanggal": tanggal_str,
             "waktu": waktu_str,
             "image": image_filename,
             "image_data": image_data,
+            "image_url": image_url,
             "pred_class_1": row['pred_class_1'],
             "pred_class_2": row['pred_class_2'],
             "pred_class_3": row['pred_class_3']
         })
 
-    cursor.close()
-    db.close()
+    record_stages("smartfarm_get_data_stage_seconds", timings, image_mode=image_mode)
 
-    return jsonify(results)
+    response = jsonify(results)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response
     
-@app.route('/search', methods=['GET'])
-def search_data():
-    q = request.args.get('q', '').strip()
+# Keyset pagination untuk /get-data dan /search: urutan (tanggal, waktu, id) menurun,
+# halaman berikutnya dimulai setelah baris terakhir yang dikodekan di header X-Next-Cursor
+PAGE_SIZE_DEFAULT = int(os.getenv("PAGE_SIZE", "30"))
+PAGE_SIZE_MAX = int(os.getenv("PAGE_SIZE_MAX", "200"))
 
-    db = mysql.connector.connect(
-        host=os.getenv("DB_HOST"),
-        user=os.getenv("DB_USER"),
-        password=os.getenv("DB_PASS"),
-        database=os.getenv("DB_NAME")
-    )
-    cursor = db.cursor(dictionary=True)
 
-    # Hanya ambil kolom yang dibutuhkan (tanpa conf_*)
-    query = """
-        SELECT tanggal, waktu, image, pred_class_1, pred_class_2, pred_class_3
-        FROM chili_predictions_v1
-    """
-    where_clauses = []
-    params = []
+def get_page_size(value):
+    try:
+        size = int(value) if value is not None else PAGE_SIZE_DEFAULT
+    except (TypeError, ValueError):
+        raise ValueError("Parameter limit harus berupa angka.")
+    return max(1, min(size, PAGE_SIZE_MAX))
+
+
+def encode_cursor(row):
+    key = [str(row['tanggal']), str(row['waktu']), row['id']]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        tanggal, waktu, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return tanggal, waktu, int(row_id)
+    except Exception:
+        raise ValueError("Cursor tidak valid.")
+
+
+def keyset_clause(prefix=""):
+    # Bentuk OR yang dijabarkan supaya MySQL bisa memakai range scan pada index (tanggal, waktu, id)
+    return (f"({prefix}tanggal < %s OR ({prefix}tanggal = %s AND "
+            f"({prefix}waktu < %s OR ({prefix}waktu = %s AND {prefix}id < %s))))")
+
+
+def keyset_params(cursor):
+    tanggal, waktu, row_id = decode_cursor(cursor)
+    return [tanggal, tanggal, waktu, waktu, row_id]
+
+
+# Kolom yang bisa dicari lewat /search (conf_* tidak termasuk)
+SEARCH_FIELDS = ["tanggal", "waktu", "image", "pred_class_1", "pred_class_2", "pred_class_3"]
+CLASS_FIELDS = ["pred_class_1", "pred_class_2", "pred_class_3"]
+# Sama dengan innodb_ft_min_token_size; kata yang lebih pendek tidak masuk index FULLTEXT
+FULLTEXT_MIN_TOKEN = int(os.getenv("FULLTEXT_MIN_TOKEN", "3"))
+CLASS_LABEL_TTL = 600
+
+_class_labels = {"labels": None, "loaded_at": 0.0}
+_class_labels_lock = threading.Lock()
+
 
-    # Daftar kolom string (conf_* tidak termasuk lagi)
-    string_fields = ["tanggal", "waktu", "image", "pred_class_1", "pred_class_2", "pred_class_3"]
+def get_class_labels():
+    """Label kelas yang dikenal: dari model jika sudah dimuat, kalau tidak dari DB (di-cache)."""
+    model = _model_state["model"]
+    if model is not None:
+        return set(model.model.names.values())
+
+    with _class_labels_lock:
+        if _class_labels["labels"] is None or perf_counter() - _class_labels["loaded_at"] > CLASS_LABEL_TTL:
+            with get_db() as db:
+                cursor = db.cursor()
+                cursor.execute("SELECT DISTINCT pred_class_1 FROM chili_predictions_v1")
+                _class_labels["labels"] = {row[0] for row in cursor.fetchall() if row[0]}
+                cursor.close()
+            _class_labels["loaded_at"] = perf_counter()
+        return _class_labels["labels"]
+
+
+def _date_range(value):
+    # "YYYY-MM-DD", "YYYY-MM" atau "YYYY" -> rentang [awal, akhir). Hanya bentuk lengkap dengan nol
+    # di depan: strptime juga menerima "2025-5" atau "12", yang sebagai substring berarti hal lain.
+    if not re.fullmatch(r"\d{4}(-\d{2}(-\d{2})?)?", value):
+        return None
+    for fmt in ("%Y-%m-%d", "%Y-%m", "%Y"):
+        try:
+            start = datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+        if fmt == "%Y-%m-%d":
+            end = start + timedelta(days=1)
+        elif fmt == "%Y-%m":
+            end = (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+        else:
+            end = start.replace(year=start.year + 1)
+        return start, end
+    return None
+
+
+def _time_range(value):
+    # "HH:MM:SS", "HH:MM" atau "HH" -> rentang [awal, akhir) dalam format TIME MySQL
+    parts = value.split(":")
+    if not 1 <= len(parts) <= 3 or not all(p.isdigit() and len(p) == 2 for p in parts):
+        return None
+    nums = [int(p) for p in parts] + [0] * (3 - len(parts))
+    if nums[0] > 23 or nums[1] > 59 or nums[2] > 59:
+        return None
+    start = nums[0] * 3600 + nums[1] * 60 + nums[2]
+    end = start + {1: 3600, 2: 60, 3: 1}[len(parts)]
+    return _format_seconds(start), _format_seconds(end)
+
+
+def _format_seconds(total_seconds):
+    return f"{total_seconds // 3600:02}:{total_seconds % 3600 // 60:02}:{total_seconds % 60:02}"
+
+
+def _fulltext_terms(value):
+    # Pecah di karakter non-kata (termasuk operator boolean FULLTEXT),
+    # lalu jadikan setiap kata pencarian prefix yang wajib ada
+    words = [w for w in re.split(r"\W+", value) if len(w) >= FULLTEXT_MIN_TOKEN]
+    return " ".join(f"+{w}*" for w in words)
+
+
+def build_search_query(q, class_labels=(), use_fulltext=False):
+    """Ubah input /search menjadi (klausa WHERE, params) yang bisa memakai index.
+
+    Tanggal dan waktu menjadi rentang, label kelas menjadi kesamaan. Nilai lain tetap dicari
+    sebagai substring seperti sebelumnya (teks bebas di semua kolom, termasuk tanggal dan waktu),
+    atau lewat FULLTEXT jika use_fulltext. Mengembalikan (None, []) untuk input kosong dan
+    ValueError untuk nama kolom yang tidak dikenal.
+    """
+    labels = {label.lower(): label for label in class_labels}
 
     if "=" in q:
         field, value = q.split("=", 1)
         field = field.strip()
         value = value.strip()
 
-        if field in string_fields:
-            where_clauses.append(f"{field} LIKE %s")
-            params.append(f"%{value}%")
-        else:
-            return jsonify({"error": f"Kolom '{field}' tidak dikenali."}), 400
-    else:
-        like_term = f"%{q}%"
-        for field in string_fields:
-            where_clauses.append(f"{field} LIKE %s")
-            params.append(like_term)
+        if field not in SEARCH_FIELDS:
+            raise ValueError(f"Kolom '{field}' tidak dikenali.")
 
-    if where_clauses:
-        query += " WHERE " + " OR ".join(where_clauses)
+        if field == "tanggal" and _date_range(value):
+            return "tanggal >= %s AND tanggal < %s", list(_date_range(value))
+        if field == "waktu" and _time_range(value):
+            return "waktu >= %s AND waktu < %s", list(_time_range(value))
+        if field in CLASS_FIELDS and value.lower() in labels:
+            return f"{field} = %s", [labels[value.lower()]]
+        # Selain itu tetap pencarian substring seperti sebelumnya
+        return f"{field} LIKE %s", [f"%{value}%"]
 
-    query += " ORDER BY tanggal DESC, waktu DESC LIMIT 30"
+    if not q:
+        return None, []
+
+    if _date_range(q):
+        return "tanggal >= %s AND tanggal < %s", list(_date_range(q))
+    if _time_range(q) and ":" in q:
+        return "waktu >= %s AND waktu < %s", list(_time_range(q))
+    if q.lower() in labels:
+        label = labels[q.lower()]
+        return " OR ".join(f"{field} = %s" for field in CLASS_FIELDS), [label] * len(CLASS_FIELDS)
+
+    terms = _fulltext_terms(q) if use_fulltext else ""
+    if terms:
+        return "MATCH (image, pred_class_1, pred_class_2, pred_class_3) AGAINST (%s IN BOOLEAN MODE)", [terms]
+
+    # Substring di semua kolom, sama dengan perilaku lama (mis. "05-18" atau "_1")
+    return " OR ".join(f"{field} LIKE %s" for field in SEARCH_FIELDS), [f"%{q}%"] * len(SEARCH_FIELDS)
+
+
+@app.route('/search', methods=['GET'])
+def search_data():
+    q = request.args.get('q', '').strip()
+
+    # Hanya ambil kolom yang dibutuhkan (tanpa conf_*)
+    query = """
+        SELECT id, tanggal, waktu, image, pred_class_1, pred_class_2, pred_class_3
+        FROM chili_predictions_v1
+    """
+
+    try:
+        page_size = get_page_size(request.args.get('limit'))
+        cursor_param = request.args.get('cursor')
+        after = keyset_params(cursor_param) if cursor_param else None
+        where_clause, params = build_search_query(q, get_class_labels(), SEARCH_FULLTEXT)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if where_clause and after:
+        query += f" WHERE ({where_clause}) AND {keyset_clause()}"
+        params = params + after
+    elif where_clause:
+        query += " WHERE " + where_clause
+    elif after:
+        query += " WHERE " + keyset_clause()
+        params = after
+
+    query += " ORDER BY tanggal DESC, waktu DESC, id DESC LIMIT %s"
+    params = params + [page_size + 1]
+
+    with get_db() as db:
+        cursor = db.cursor(dictionary=True)
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+        cursor.close()
+
+    next_cursor = encode_cursor(rows[page_size - 1]) if len(rows) > page_size else None
+    rows = rows[:page_size]
 
-    cursor.execute(query, params)
-    rows = cursor.fetchall()
-    
     # Konversi tipe waktu ke string jika perlu
     for row in rows:
+        row.pop('id', None)
         for key, value in row.items():
             if isinstance(value, (datetime, date, time)):
                 row[key] = str(value)
@@ -400,10 +2247,10 @@ def search_data():
             elif isinstance(value, Decimal):
                 row[key] = float(value)
 
-    cursor.close()
-    db.close()
-
-    return jsonify(rows)
+    response = jsonify(rows)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response
 
 @app.route('/delete', methods=['POST'])
 def delete_data():
@@ -416,50 +2263,226 @@ def delete_data():
     if not all([tanggal, waktu, image]):
         return jsonify({"error": "Parameter tanggal, waktu, dan image wajib diisi."}), 400
 
-    db = mysql.connector.connect(
-        host=os.getenv("DB_HOST"),
-        user=os.getenv("DB_USER"),
-        password=os.getenv("DB_PASS"),
-        database=os.getenv("DB_NAME")
-    )
-    cursor = db.cursor()
-
-    cursor.execute("""
-        DELETE FROM chili_predictions_v1
-        WHERE tanggal = %s AND waktu = %s AND image = %s
-    """, (tanggal, waktu, image))
-    db.commit()
-
-    cursor.close()
-    db.close()
+    with get_db() as db:
+        cursor = db.cursor()
+        try:
+            # Ambil dulu baris yang akan dihapus supaya agregat /stats bisa dikurangi
+            cursor.execute("""
+                SELECT tanggal, run_id, pred_class_1, conf_1 FROM chili_predictions_v1
+                WHERE tanggal = %s AND waktu = %s AND image = %s
+                FOR UPDATE
+            """, (tanggal, waktu, image))
+            deleted_rows = cursor.fetchall()
+
+            cursor.execute("""
+                DELETE FROM chili_predictions_v1
+                WHERE tanggal = %s AND waktu = %s AND image = %s
+            """, (tanggal, waktu, image))
+
+            for row_tanggal, run_id, pred_class, conf in deleted_rows:
+                if pred_class is None:
+                    continue
+                cursor.execute(UPSERT_STATS_DAILY_SQL, (row_tanggal, pred_class, -1, -(conf or 0.0)))
+                if run_id is not None:
+                    cursor.execute(UPSERT_STATS_RUN_SQL, (run_id, pred_class, -1, -(conf or 0.0)))
+            db.commit()
+        except mysql.connector.Error:
+            db.rollback()
+            raise
+        finally:
+            cursor.close()
+
+    invalidate_result_cache()
 
     return jsonify({"message": "Data berhasil dihapus."})
     
+# Retensi Storage: folder kadaluarsa dicari lewat indeks timestamp (bukan scan seluruh Storage),
+# lalu dihapus di thread pool terbatas dengan batas laju I/O agar disk tidak jenuh saat worker lain
+# melayani request. Opsional: folder diarsipkan dulu ke tar.gz di Archive/.
+RETENTION_DAYS = int(os.getenv("RETENTION_DAYS", "730"))
+RETENTION_WORKERS = int(os.getenv("RETENTION_WORKERS", "2"))
+RETENTION_IO_MB_PER_SEC = float(os.getenv("RETENTION_IO_MB_PER_SEC", "0"))  # 0 = tanpa batas
+RETENTION_ARCHIVE = os.getenv("RETENTION_ARCHIVE", "0") == "1"
+ARCHIVE_DIR = os.path.join(ROOT_DIR, 'Archive')
+
+_retention_lock = threading.Lock()
+_retention_state = {"status": "idle", "started": None, "finished": None, "elapsed": None,
+                    "cutoff": None, "archive": False, "folders_total": 0, "folders_done": 0,
+                    "bytes_freed": 0, "bytes_archived": 0, "deleted": [], "errors": []}
+_io_bucket = {"tokens": 0.0, "updated": perf_counter()}
+_io_bucket_lock = threading.Lock()
+
+
+def _throttle_io(nbytes):
+    # Token bucket bersama semua thread retensi; kapasitas satu detik
+    if RETENTION_IO_MB_PER_SEC <= 0:
+        return
+    rate = RETENTION_IO_MB_PER_SEC * 1024 * 1024
+    with _io_bucket_lock:
+        now = perf_counter()
+        _io_bucket["tokens"] = min(rate, _io_bucket["tokens"] + (now - _io_bucket["updated"]) * rate)
+        _io_bucket["updated"] = now
+        _io_bucket["tokens"] -= nbytes
+        wait = -_io_bucket["tokens"] / rate if _io_bucket["tokens"] < 0 else 0
+    if wait:
+        sleep(wait)
+
+
+def _archive_storage_folder(folder_name):
+    folder_path = os.path.join(STORAGE_DIR, folder_name)
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    archive_path = os.path.join(ARCHIVE_DIR, f"{folder_name}.tar.gz")
+    tmp_path = f"{archive_path}.tmp"
+    with tarfile.open(tmp_path, "w:gz") as tar:
+        for name in sorted(os.listdir(folder_path)):
+            path = os.path.join(folder_path, name)
+            if os.path.isfile(path):
+                _throttle_io(os.path.getsize(path))
+                tar.add(path, arcname=f"{folder_name}/{name}")
+    os.replace(tmp_path, archive_path)
+    return os.path.getsize(archive_path)
+
+
+def delete_storage_folder(folder_name, archive=False):
+    """Hapus satu folder Storage beserta thumbnail dan entri indeksnya. Mengembalikan (bytes_freed, bytes_archived)."""
+    folder_path = os.path.join(STORAGE_DIR, folder_name)
+    archived = _archive_storage_folder(folder_name) if archive else 0
+
+    freed = 0
+    for dirpath, dirnames, filenames in os.walk(folder_path, topdown=False):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            size = os.path.getsize(path)
+            _throttle_io(size)
+            os.remove(path)
+            freed += size
+        for name in dirnames:
+            os.rmdir(os.path.join(dirpath, name))
+    os.rmdir(folder_path)
+
+    remove_thumbnails(folder_name)
+    storage_index_remove(folder_name)
+    return freed, archived
+
+
+def _run_retention(folders, archive):
+    state = _retention_state
+
+    def work(folder_name):
+        try:
+            freed, archived = delete_storage_folder(folder_name, archive)
+        except Exception as e:
+            with _retention_lock:
+                state["errors"].append({"direktori": folder_name, "error": str(e)})
+                state["folders_done"] += 1
+            return
+        with _retention_lock:
+            state["deleted"].append(folder_name)
+            state["bytes_freed"] += freed
+            state["bytes_archived"] += archived
+            state["folders_done"] += 1
+
+    started = perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=RETENTION_WORKERS) as executor:
+            list(executor.map(work, folders))
+    finally:
+        if state["deleted"]:
+            invalidate_result_cache()
+        with _retention_lock:
+            state["status"] = "idle"
+            state["finished"] = datetime.now().isoformat(timespec="seconds")
+            state["elapsed"] = round(perf_counter() - started, 3)
+        observe("smartfarm_task_seconds", perf_counter() - started, task="retention",
+                status="error" if state["errors"] else "ok")
+
+
+def start_retention(folders=None, archive=None, wait=False):
+    """Mulai penghapusan di background. Tanpa `folders`, yang dihapus adalah folder lebih tua dari RETENTION_DAYS.
+
+    Mengembalikan False jika masih ada proses retensi yang berjalan."""
+    archive = RETENTION_ARCHIVE if archive is None else archive
+    cutoff = None
+    if folders is None:
+        cutoff = datetime.now() - timedelta(days=RETENTION_DAYS)
+        folders = find_storage_folders(datetime.min, cutoff)
+
+    with _retention_lock:
+        if _retention_state["status"] == "running":
+            return False
+        _retention_state.update({
+            "status": "running", "started": datetime.now().isoformat(timespec="seconds"),
+            "finished": None, "elapsed": None,
+            "cutoff": cutoff.isoformat(timespec="seconds") if cutoff else None, "archive": archive,
+            "folders_total": len(folders), "folders_done": 0, "bytes_freed": 0, "bytes_archived": 0,
+            "deleted": [], "errors": []
+        })
+
+    if wait:
+        _run_retention(folders, archive)
+    else:
+        threading.Thread(target=_run_retention, args=(folders, archive), daemon=True).start()
+    return True
+
+
+def retention_status():
+    with _retention_lock:
+        return json.loads(json.dumps(_retention_state))
+
+
 @app.route('/clean-old-dirs', methods=['GET'])
 def clean_old_directories():
-    # Struktur direktori
-    
-    deleted_dirs = []
-    now = datetime.now()
+    archive = request.args.get("archive")
+    archive = None if archive is None else archive == "1"
+    wait = request.args.get("wait") == "1"
+
+    if not start_retention(archive=archive, wait=wait):
+        return jsonify({"error": "Proses retensi masih berjalan.", **retention_status()}), 409
+
+    status = retention_status()
+    if wait:
+        return jsonify({"deleted_directories": status["deleted"], **status})
+    return jsonify(status), 202
 
-    for folder_name in os.listdir(STORAGE_DIR):
-        folder_path = os.path.join(STORAGE_DIR, folder_name)
-        if os.path.isdir(folder_path):
-            try:
-                folder_date_str = folder_name.split('_')[0]  # e.g., '2023-05-10'
-                folder_date = datetime.strptime(folder_date_str, "%Y-%m-%d")
-                if (now - folder_date).days > 730:
-                    shutil.rmtree(folder_path)
-                    deleted_dirs.append(folder_name)
-            except Exception as e:
-                continue  # Lewati folder dengan format nama yang tidak sesuai
 
-    return jsonify({"deleted_directories": deleted_dirs})
+@app.route('/retention-status', methods=['GET'])
+def get_retention_status():
+    return jsonify(retention_status())
+
 
 def run_clean_old_dir():
-    with app.test_request_context():
-        return clean_old_directories()
-    
+    # Dipanggil dari thread scheduler, jadi boleh menunggu sampai selesai
+    if not start_retention(wait=True):
+        raise RuntimeError("Proses retensi masih berjalan.")
+    return retention_status()
+
+
+# Prefix nama folder Storage yang lengkap dengan nol di depan; selain ini /delete-dir memakai substring
+KEYWORD_PREFIX_PATTERN = re.compile(r"^\d{4}(-\d{2}(-\d{2}(_\d{2}(-\d{2}(-\d{2})?)?)?)?)?$")
+
+
+def _keyword_range(keyword):
+    # "2025", "2025-05", "2025-05-18", "2025-05-18_11", ... -> rentang timestamp untuk indeks.
+    # strptime menerima bulan/hari satu digit ("2025-1" = Januari), padahal secara substring
+    # "2025-1" berarti Oktober-Desember, jadi hanya prefix yang lengkap yang boleh lewat indeks.
+    if not KEYWORD_PREFIX_PATTERN.fullmatch(keyword):
+        return None
+    formats = [("%Y", None), ("%Y-%m", None), ("%Y-%m-%d", timedelta(days=1)),
+               ("%Y-%m-%d_%H", timedelta(hours=1)), ("%Y-%m-%d_%H-%M", timedelta(minutes=1)),
+               (STORAGE_FOLDER_FORMAT, timedelta(seconds=1))]
+    for fmt, step in formats:
+        try:
+            start = datetime.strptime(keyword, fmt)
+        except ValueError:
+            continue
+        if fmt == "%Y":
+            return start, start.replace(year=start.year + 1)
+        if fmt == "%Y-%m":
+            return start, (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+        return start, start + step
+    return None
+
+
 @app.route('/delete-dir', methods=['POST'])
 def delete_directory_by_name():
     try:
@@ -468,22 +2491,27 @@ def delete_directory_by_name():
             return jsonify({"error": "JSON harus memiliki field 'direktori'"}), 400
 
         keyword = data['direktori']
+        if not keyword:
+            return jsonify({"error": "Field 'direktori' tidak boleh kosong"}), 400
 
-        deleted_dirs = []
+        # Prefix tanggal/waktu dicari lewat indeks; keyword lain tetap dicocokkan dengan substring
+        key_range = _keyword_range(keyword)
+        if key_range:
+            folders = find_storage_folders(*key_range)
+        else:
+            folders = [name for name in os.listdir(STORAGE_DIR)
+                       if keyword in name and os.path.isdir(os.path.join(STORAGE_DIR, name))]
 
-        for folder_name in os.listdir(STORAGE_DIR):
-            if keyword in folder_name:
-                folder_path = os.path.join(STORAGE_DIR, folder_name)
-                if os.path.isdir(folder_path):
-                    try:
-                        shutil.rmtree(folder_path)
-                        deleted_dirs.append(folder_name)
-                    except Exception as e:
-                        continue  # Lewati jika gagal menghapus
+        if not start_retention(folders=folders, archive=data.get("archive"), wait=True):
+            return jsonify({"error": "Proses retensi masih berjalan.", **retention_status()}), 409
 
+        status = retention_status()
         return jsonify({
             "keyword": keyword,
-            "deleted_directories": deleted_dirs
+            "deleted_directories": status["deleted"],
+            "bytes_freed": status["bytes_freed"],
+            "elapsed": status["elapsed"],
+            "errors": status["errors"]
         })
 
     except Exception as e:
@@ -498,6 +2526,7 @@ def update_schedule():
 
     with open(SCHEDULE_FILE, 'w') as f:
         json.dump(data, f, indent=4)
+    reload_schedule()
 
     message = "Schedule updated."
     if run_now:
@@ -511,45 +2540,413 @@ def check_schedule():
     return jsonify(check_schedule_internal())
 
 
+# Scheduler di dalam proses. Config dibaca sekali (dibaca ulang jika file berubah), setiap entri
+# jadwal dihitung waktu jalan berikutnya dan disimpan di heap. Hanya satu worker Passenger yang
+# menjalankan loop (lock file), dan setiap waktu jadwal dicatat di Scheduler/scheduler_state.json
+# sehingga task tidak jalan dua kali walau /check-schedule juga dipanggil dari cron.
+#
+# Format entri: per_day "HH:MM", per_week "Monday HH:MM", per_month "DD HH:MM", per_year "MM-DD HH:MM"
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "0") == "1"
+SCHEDULER_WORKERS = int(os.getenv("SCHEDULER_WORKERS", "2"))
+# Jadwal yang terlambat lebih dari ini (detik) dicatat sebagai missed, tidak dijalankan
+SCHEDULER_GRACE_SECONDS = int(os.getenv("SCHEDULER_GRACE_SECONDS", "120"))
+SCHEDULER_POLL_SECONDS = 30
+SCHEDULER_MISSED_LIMIT = 50
+SCHEDULER_LEADER_LOCK = os.path.join(ROOT_DIR, 'Scheduler', 'scheduler_leader.lock')
+SCHEDULER_STATE_LOCK = os.path.join(ROOT_DIR, 'Scheduler', 'scheduler_state.lock')
+SCHEDULER_STATE_FILE = os.path.join(ROOT_DIR, 'Scheduler', 'scheduler_state.json')
+SCHEDULE_KINDS = ("per_day", "per_week", "per_month", "per_year")
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+_schedule_cache = {"mtime": None, "config": None}
+_schedule_lock = threading.Lock()
+_scheduler = {"thread": None, "leader": False, "leader_fd": None, "heap": [], "config_mtime": None,
+              "wake": threading.Event()}
+_scheduler_executor = ThreadPoolExecutor(max_workers=SCHEDULER_WORKERS)
+
+
+def load_schedule():
+    """Config jadwal yang sudah di-parse; file hanya dibaca ulang jika mtime-nya berubah."""
+    try:
+        mtime = os.stat(SCHEDULE_FILE).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    with _schedule_lock:
+        if mtime != _schedule_cache["mtime"]:
+            with open(SCHEDULE_FILE, 'r') as f:
+                _schedule_cache["config"] = json.load(f)
+            _schedule_cache["mtime"] = mtime
+        return _schedule_cache["config"]
+
+
+def reload_schedule():
+    # Dipanggil setelah /update-schedule: paksa loop scheduler membangun ulang heap-nya
+    _scheduler["config_mtime"] = None
+    _scheduler["wake"].set()
+
+
+def _parse_hhmm(value):
+    # Terima juga "20.00" seperti yang ada di config lama
+    hour, minute = value.replace(".", ":").split(":")
+    hour, minute = int(hour), int(minute)
+    if not (0 <= hour <= 23 and 0 <= minute <= 59):
+        raise ValueError(f"Jam tidak valid: {value}")
+    return hour, minute
+
+
+def next_fire_time(kind, entry, after):
+    """Waktu jalan berikutnya (presisi menit) yang lebih besar dari `after`, atau None."""
+    parts = entry.split()
+    hour, minute = _parse_hhmm(parts[-1])
+    base = after.replace(second=0, microsecond=0)
+
+    if kind == "per_day":
+        candidate = base.replace(hour=hour, minute=minute)
+        if candidate <= after:
+            candidate += timedelta(days=1)
+        return candidate
+
+    if kind == "per_week":
+        weekday = [d.lower() for d in WEEKDAYS].index(parts[0].lower())
+        candidate = base.replace(hour=hour, minute=minute) + timedelta(days=(weekday - base.weekday()) % 7)
+        if candidate <= after:
+            candidate += timedelta(days=7)
+        return candidate
+
+    if kind == "per_month":
+        day = int(parts[0])
+        year, month = base.year, base.month
+        # Bulan yang tidak punya tanggal tersebut (mis. 31) dilewati
+        for _ in range(48):
+            try:
+                candidate = datetime(year, month, day, hour, minute)
+            except ValueError:
+                candidate = None
+            if candidate and candidate > after:
+                return candidate
+            year, month = (year, month + 1) if month < 12 else (year + 1, 1)
+        return None
+
+    if kind == "per_year":
+        month, day = map(int, parts[0].split("-"))
+        for year in range(base.year, base.year + 9):
+            try:
+                candidate = datetime(year, month, day, hour, minute)
+            except ValueError:
+                continue
+            if candidate > after:
+                return candidate
+        return None
+
+    raise ValueError(f"Jenis jadwal tidak dikenal: {kind}")
+
+
+def schedule_entries(schedule):
+    for task_name, config in (schedule or {}).items():
+        for kind in SCHEDULE_KINDS:
+            for entry in config.get(kind, []):
+                yield task_name, kind, entry
+
+
+@contextmanager
+def _scheduler_state():
+    """Baca-ubah-tulis state scheduler di bawah lock file yang sama untuk semua worker."""
+    os.makedirs(os.path.dirname(SCHEDULER_STATE_LOCK), exist_ok=True)
+    with open(SCHEDULER_STATE_LOCK, "w") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            with open(SCHEDULER_STATE_FILE) as f:
+                state = json.load(f)
+        except (FileNotFoundError, ValueError):
+            state = {}
+        for key in ("last_fired", "last_runs"):
+            state.setdefault(key, {})
+        state.setdefault("missed", [])
+        state.setdefault("last_check", None)
+
+        yield state
+
+        tmp_path = f"{SCHEDULER_STATE_FILE}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f, indent=4)
+        os.replace(tmp_path, SCHEDULER_STATE_FILE)
+
+
+def _run_scheduled_task(task_name):
+    started = datetime.now()
+    error = None
+    try:
+        if task_name == "classify":
+            run_classify()
+        elif task_name == "clean_old_dir":
+            run_clean_old_dir()
+        else:
+            error = "Task tidak dikenal."
+    except Exception as e:
+        error = str(e)
+    duration = (datetime.now() - started).total_seconds()
+    observe("smartfarm_task_seconds", duration, task=task_name, status="error" if error else "ok")
+    with _scheduler_state() as state:
+        state["last_runs"][task_name] = {
+            "started": started.isoformat(timespec="seconds"),
+            "duration": round(duration, 3),
+            "error": error
+        }
+
+
+def fire_task(task_name, fire_dt):
+    """Jalankan task untuk waktu jadwal ini tepat sekali, walau dipicu dari beberapa worker/cron."""
+    fire_key = fire_dt.strftime("%Y-%m-%d %H:%M")
+    with _scheduler_state() as state:
+        if state["last_fired"].get(task_name, "") >= fire_key:
+            return False
+        state["last_fired"][task_name] = fire_key
+    _scheduler_executor.submit(_run_scheduled_task, task_name)
+    return True
+
+
+def _record_missed(state, task_name, fire_dt):
+    fire_key = fire_dt.strftime("%Y-%m-%d %H:%M")
+    if state["last_fired"].get(task_name, "") >= fire_key:
+        return
+    state["missed"].append({"task": task_name, "scheduled": fire_key})
+    del state["missed"][:-SCHEDULER_MISSED_LIMIT]
+    print(f"Jadwal {task_name} {fire_key} terlewat.")
+
+
+def _rebuild_schedule_heap(now):
+    schedule = load_schedule()
+    heap = []
+    for seq, (task_name, kind, entry) in enumerate(schedule_entries(schedule)):
+        try:
+            fire_dt = next_fire_time(kind, entry, now)
+        except (ValueError, IndexError) as e:
+            print(f"Entri jadwal {task_name} {kind} '{entry}' dilewati: {e}")
+            continue
+        if fire_dt:
+            heap.append((fire_dt, seq, task_name, kind, entry))
+    heapq.heapify(heap)
+    _scheduler["heap"] = heap
+    _scheduler["config_mtime"] = _schedule_cache["mtime"]
+
+
+def _record_missed_since_last_check(now):
+    # Jadwal di antara pengecekan terakhir (oleh worker mana pun) dan sekarang yang tidak pernah jalan
+    with _scheduler_state() as state:
+        if not state["last_check"]:
+            return
+        last_check = datetime.fromisoformat(state["last_check"])
+        for task_name, kind, entry in schedule_entries(load_schedule()):
+            try:
+                fire_dt = next_fire_time(kind, entry, last_check)
+                for _ in range(SCHEDULER_MISSED_LIMIT):
+                    if fire_dt is None or fire_dt > now - timedelta(seconds=SCHEDULER_GRACE_SECONDS):
+                        break
+                    _record_missed(state, task_name, fire_dt)
+                    fire_dt = next_fire_time(kind, entry, fire_dt)
+            except (ValueError, IndexError):
+                continue
+
+
+def _try_become_leader():
+    if fcntl is None:
+        _scheduler["leader"] = True
+        return True
+    os.makedirs(os.path.dirname(SCHEDULER_LEADER_LOCK), exist_ok=True)
+    lock_file = open(SCHEDULER_LEADER_LOCK, "w")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return False
+    # Lock dilepas otomatis oleh OS jika worker ini mati, sehingga worker lain bisa mengambil alih
+    _scheduler["leader_fd"] = lock_file
+    _scheduler["leader"] = True
+    return True
+
+
+def _scheduler_loop():
+    while True:
+        wake = _scheduler["wake"]
+        try:
+            now = datetime.now()
+            if not _scheduler["leader"]:
+                if not _try_become_leader():
+                    wake.wait(SCHEDULER_POLL_SECONDS)
+                    wake.clear()
+                    continue
+                _record_missed_since_last_check(now)
+                _rebuild_schedule_heap(now)
+
+            load_schedule()
+            if _scheduler["config_mtime"] is None or _scheduler["config_mtime"] != _schedule_cache["mtime"]:
+                _rebuild_schedule_heap(now)
+
+            heap = _scheduler["heap"]
+            while heap and heap[0][0] <= now:
+                fire_dt, seq, task_name, kind, entry = heapq.heappop(heap)
+                if (now - fire_dt).total_seconds() > SCHEDULER_GRACE_SECONDS:
+                    with _scheduler_state() as state:
+                        _record_missed(state, task_name, fire_dt)
+                else:
+                    fire_task(task_name, fire_dt)
+                next_dt = next_fire_time(kind, entry, fire_dt)
+                if next_dt:
+                    heapq.heappush(heap, (next_dt, seq, task_name, kind, entry))
+
+            with _scheduler_state() as state:
+                state["last_check"] = now.isoformat(timespec="seconds")
+
+            timeout = SCHEDULER_POLL_SECONDS
+            if heap:
+                timeout = min(timeout, max((heap[0][0] - datetime.now()).total_seconds(), 0.5))
+        except Exception as e:
+            print(f"Scheduler error: {e}")
+            timeout = SCHEDULER_POLL_SECONDS
+        wake.wait(timeout)
+        wake.clear()
+
+
+def start_scheduler():
+    if _scheduler["thread"] is None or not _scheduler["thread"].is_alive():
+        _scheduler["thread"] = threading.Thread(target=_scheduler_loop, daemon=True)
+        _scheduler["thread"].start()
+
+
+@app.route('/scheduler-status', methods=['GET'])
+def scheduler_status():
+    with _scheduler_state() as state:
+        state = json.loads(json.dumps(state))
+    return jsonify({
+        "running": _scheduler["thread"] is not None and _scheduler["thread"].is_alive(),
+        "leader": _scheduler["leader"],
+        "next_runs": [
+            {"task": task_name, "time": fire_dt.strftime("%Y-%m-%d %H:%M"), "jenis": kind, "entry": entry}
+            for fire_dt, _, task_name, kind, entry in heapq.nsmallest(10, _scheduler["heap"])
+        ],
+        "last_check": state["last_check"],
+        "last_fired": state["last_fired"],
+        "last_runs": state["last_runs"],
+        "missed_runs": state["missed"]
+    })
+
+
 def check_schedule_internal():
-    if not os.path.exists(SCHEDULE_FILE):
+    schedule = load_schedule()
+    if schedule is None:
         return {"status": "error", "message": "No schedule config found."}
 
-    with open(SCHEDULE_FILE, 'r') as f:
-        schedule = json.load(f)
-
     now = datetime.now()
+    current_minute = now.replace(second=0, microsecond=0)
     current_time = now.strftime("%H:%M")
-    current_weekday = now.strftime("%A")
-    current_date = now.strftime("%m-%d")
 
     triggered_tasks = []
 
-    for task_name, config in schedule.items():
-        if "per_day" in config and current_time in config["per_day"]:
+    # Entri cocok jika waktu jalan berikutnya setelah menit sebelumnya adalah menit ini
+    for task_name, kind, entry in schedule_entries(schedule):
+        try:
+            fire_dt = next_fire_time(kind, entry, current_minute - timedelta(minutes=1))
+        except (ValueError, IndexError):
+            continue
+        if fire_dt == current_minute and task_name not in triggered_tasks:
             triggered_tasks.append(task_name)
-        if "per_week" in config:
-            for entry in config["per_week"]:
-                day, time = entry.split()
-                if day == current_weekday and time == current_time:
-                    triggered_tasks.append(task_name)
-        if "per_year" in config:
-            for entry in config["per_year"]:
-                date, time = entry.split()
-                if date == current_date and time == current_time:
-                    triggered_tasks.append(task_name)
-
-    for task in set(triggered_tasks):
-        if task == "classify":
-            run_classify()
-        elif task == "clean_old_dir":
-            run_clean_old_directories()
+
+    for task in triggered_tasks:
+        fire_task(task, current_minute)
 
     return {
-        "triggered": list(set(triggered_tasks)),
+        "triggered": triggered_tasks,
         "time": current_time
     }
     
+# Indeks terurut timestamp capture -> nama folder Storage, untuk pencarian rentang dengan bisect.
+# Diperbarui saat folder dibuat/dihapus; mtime STORAGE_DIR dipakai untuk mendeteksi perubahan
+# dari worker Passenger lain sehingga indeks dibangun ulang bila perlu.
+STORAGE_FOLDER_FORMAT = "%Y-%m-%d_%H-%M-%S"
+
+_storage_index = {"keys": [], "folders": [], "mtime": None}
+_storage_index_lock = threading.Lock()
+
+
+def parse_folder_timestamp(folder_name):
+    try:
+        return datetime.strptime(folder_name, STORAGE_FOLDER_FORMAT)
+    except ValueError:
+        return None
+
+
+def _rebuild_storage_index():
+    entries = []
+    try:
+        mtime = os.stat(STORAGE_DIR).st_mtime_ns
+        names = os.listdir(STORAGE_DIR)
+    except FileNotFoundError:
+        mtime, names = None, []
+    for name in names:
+        ts = parse_folder_timestamp(name)
+        if ts is not None and os.path.isdir(os.path.join(STORAGE_DIR, name)):
+            entries.append((ts, name))
+    entries.sort()
+    _storage_index["keys"] = [ts for ts, _ in entries]
+    _storage_index["folders"] = [name for _, name in entries]
+    _storage_index["mtime"] = mtime
+
+
+def _sync_storage_index():
+    try:
+        mtime = os.stat(STORAGE_DIR).st_mtime_ns
+    except FileNotFoundError:
+        mtime = None
+    if mtime is None or mtime != _storage_index["mtime"]:
+        _rebuild_storage_index()
+
+
+def _touch_storage_index_mtime():
+    try:
+        _storage_index["mtime"] = os.stat(STORAGE_DIR).st_mtime_ns
+    except FileNotFoundError:
+        _storage_index["mtime"] = None
+
+
+def storage_index_add(folder_name):
+    ts = parse_folder_timestamp(folder_name)
+    if ts is None:
+        return
+    with _storage_index_lock:
+        _sync_storage_index()
+        i = bisect.bisect_left(_storage_index["keys"], ts)
+        if i < len(_storage_index["keys"]) and _storage_index["folders"][i] == folder_name:
+            return
+        _storage_index["keys"].insert(i, ts)
+        _storage_index["folders"].insert(i, folder_name)
+        _touch_storage_index_mtime()
+
+
+def storage_index_remove(folder_name):
+    ts = parse_folder_timestamp(folder_name)
+    if ts is None:
+        return
+    with _storage_index_lock:
+        # Sinkron dulu seperti storage_index_add: tanpa ini mtime baru di bawah menutupi folder
+        # yang dibuat worker lain sejak sinkronisasi terakhir
+        _sync_storage_index()
+        i = bisect.bisect_left(_storage_index["keys"], ts)
+        if i < len(_storage_index["keys"]) and _storage_index["folders"][i] == folder_name:
+            del _storage_index["keys"][i]
+            del _storage_index["folders"][i]
+        _touch_storage_index_mtime()
+
+
+def find_storage_folders(start_dt, end_dt):
+    """Folder Storage dengan timestamp di rentang [start_dt, end_dt), terurut dari yang terlama."""
+    with _storage_index_lock:
+        _sync_storage_index()
+        lo = bisect.bisect_left(_storage_index["keys"], start_dt)
+        hi = bisect.bisect_left(_storage_index["keys"], end_dt)
+        return _storage_index["folders"][lo:hi]
+
+
 def get_all_dirs():
     try:
         return [d for d in os.listdir(STORAGE_DIR) if os.path.isdir(os.path.join(STORAGE_DIR, d))]
@@ -563,7 +2960,100 @@ def get_week_range(year, month, week):
     end_date = start_date + timedelta(days=6)
     return start_date.date(), end_date.date()
 
+def get_week_of(day):
+    """Kebalikan get_week_range: (tahun, bulan, minggu) yang memuat tanggal tersebut.
+
+    Hari sebelum Senin pertama suatu bulan termasuk minggu terakhir bulan sebelumnya.
+    """
+    year, month = day.year, day.month
+    first_monday, _ = get_week_range(year, month, 1)
+    if day < first_monday:
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+        first_monday, _ = get_week_range(year, month, 1)
+    return year, month, (day - first_monday).days // 7 + 1
+
+
+def _stats_period_key(day, group):
+    if group == "day":
+        return day.strftime("%Y-%m-%d"), {"start": day, "end": day}
+    if group == "week":
+        year, month, week = get_week_of(day)
+        start, end = get_week_range(year, month, week)
+        return f"{year}-{month:02d}-W{week}", {"tahun": year, "bulan": month, "minggu": week, "start": start, "end": end}
+    start = day.replace(day=1)
+    end = (start.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+    return start.strftime("%Y-%m"), {"tahun": day.year, "bulan": day.month, "start": start, "end": end}
+
+
+@app.route('/stats', methods=['GET'])
+@cached_json_response("stats")
+def get_stats():
+    """Rekap jumlah dan rata-rata confidence pred_class_1 dari tabel agregat.
+
+    Query string: group=day|week|month|run (default day), start dan end (YYYY-MM-DD,
+    default 30 hari terakhir). Minggu mengikuti aturan get_week_range.
+    """
+    group = request.args.get("group", "day")
+    if group not in ("day", "week", "month", "run"):
+        return jsonify({"error": "group harus salah satu dari day, week, month, run"}), 400
+
+    try:
+        end = datetime.strptime(request.args["end"], "%Y-%m-%d").date() if request.args.get("end") else datetime.today().date()
+        start = datetime.strptime(request.args["start"], "%Y-%m-%d").date() if request.args.get("start") else end - timedelta(days=29)
+    except ValueError:
+        return jsonify({"error": "Format tanggal tidak valid, gunakan YYYY-MM-DD"}), 400
+
+    with get_db() as db:
+        cursor = db.cursor(dictionary=True)
+        if group == "run":
+            cursor.execute("""
+                SELECT r.id AS run_id, r.tanggal, r.waktu, r.folder, s.pred_class, s.jumlah, s.total_conf
+                FROM chili_runs_v1 r
+                JOIN chili_stats_run_v1 s ON s.run_id = r.id
+                WHERE r.tanggal >= %s AND r.tanggal <= %s
+                ORDER BY r.tanggal, r.waktu, s.pred_class
+            """, (start, end))
+        else:
+            cursor.execute("""
+                SELECT tanggal, pred_class, jumlah, total_conf
+                FROM chili_stats_daily_v1
+                WHERE tanggal >= %s AND tanggal <= %s
+                ORDER BY tanggal, pred_class
+            """, (start, end))
+        rows = cursor.fetchall()
+        cursor.close()
+
+    periods = OrderedDict()
+    for row in rows:
+        if row['jumlah'] <= 0:
+            continue
+        if group == "run":
+            key = str(row['run_id'])
+            info = {"run_id": row['run_id'], "tanggal": str(row['tanggal']), "waktu": str(row['waktu']), "folder": row['folder']}
+        else:
+            key, info = _stats_period_key(row['tanggal'], group)
+            info = {k: (str(v) if isinstance(v, date) else v) for k, v in info.items()}
+
+        period = periods.setdefault(key, dict(info, period=key, total=0, classes={}))
+        totals = period["classes"].setdefault(row['pred_class'], {"jumlah": 0, "total_conf": 0.0})
+        totals["jumlah"] += row['jumlah']
+        totals["total_conf"] += row['total_conf']
+        period["total"] += row['jumlah']
+
+    for period in periods.values():
+        for totals in period["classes"].values():
+            totals["mean_conf"] = round(totals.pop("total_conf") / totals["jumlah"], 4)
+
+    return jsonify({
+        "group": group,
+        "start": str(start),
+        "end": str(end),
+        "periods": list(periods.values())
+    })
+
+
 @app.route("/filter-directories", methods=["POST"])
+@cached_json_response("filter-directories")
 def filter_directories():
     data = request.get_json() or {}
     tahun = data.get("tahun")
@@ -656,18 +3146,20 @@ def get_full_image():
     except ValueError:
         return jsonify({"error": "Invalid date or time format"}), 400
 
-    # Buat nama folder target
-    target_folder_name = target_dt.strftime("%Y-%m-%d_%H-%M-%S")
-
-    # Buat daftar nama folder yang dalam rentang ± 1 menit
-    toleransi = [target_dt + timedelta(seconds=offset) for offset in range(0, 61)]
-    toleransi_names = [dt.strftime("%Y-%m-%d_%H-%M-%S") for dt in toleransi]
+    with get_db() as db:
+        cursor = db.cursor()
+        cursor.execute(
+            "SELECT folder FROM chili_runs_v1 WHERE tanggal = %s AND waktu = %s ORDER BY id LIMIT 1",
+            (target_dt.date(), target_dt.time())
+        )
+        run = cursor.fetchone()
+        cursor.close()
 
-    # Cek direktori yang sesuai
-    matching_folders = [
-        f for f in os.listdir(STORAGE_DIR)
-        if f in toleransi_names and os.path.isdir(os.path.join(STORAGE_DIR, f))
-    ]
+    if run and os.path.isdir(os.path.join(STORAGE_DIR, run[0])):
+        matching_folders = [run[0]]
+    else:
+        # Data lama tanpa tabel run: cari folder dalam rentang 0..60 detik setelah waktu target
+        matching_folders = find_storage_folders(target_dt, target_dt + timedelta(seconds=61))
 
     if not matching_folders:
         return jsonify({"error": "No matching directory found"}), 404
@@ -689,6 +3181,23 @@ def get_full_image():
     image_name = full_images[0]
     image_path = os.path.join(folder_path, image_name)
 
+    thumb_size = request.args.get('size', type=int)
+    if thumb_size and thumb_size not in THUMBNAIL_SIZES:
+        return jsonify({"error": f"Thumbnail size must be one of {THUMBNAIL_SIZES}"}), 400
+
+    if request.args.get('image_mode', 'base64') == "url":
+        if thumb_size:
+            image_url = url_for('get_thumbnail_image', size=thumb_size, filename=f"{selected_folder}/{image_name}")
+        else:
+            image_url = url_for('get_storage_image', filename=f"{selected_folder}/{image_name}")
+        return jsonify({
+            "image_name": image_name,
+            "image_url": image_url
+        })
+
+    if thumb_size:
+        image_path = get_thumbnail(selected_folder, image_name, thumb_size) or image_path
+
     try:
         with open(image_path, "rb") as img_file:
             encoded = base64.b64encode(img_file.read()).decode('utf-8')
@@ -704,8 +3213,200 @@ def get_full_image():
         "image_data": image_data
     })
         
+@app.route('/images/<path:filename>', methods=['GET'])
+def get_storage_image(filename):
+    # send_from_directory menolak path di luar STORAGE_DIR; conditional=True memberi
+    # dukungan ETag/Last-Modified (304) dan Range (206) tanpa membaca file ke memori
+    return send_from_directory(STORAGE_DIR, filename, conditional=True, etag=True, max_age=IMAGE_CACHE_MAX_AGE)
+
+
+# Indeks LRU cache thumbnail per proses: path -> ukuran file, urutan = terakhir dipakai
+_thumbnail_index = None
+_thumbnail_lock = threading.Lock()
+_thumbnail_executor = ThreadPoolExecutor(max_workers=1)
+
+
+def _thumbnail_path(folder, filename, size):
+    ext = ".webp" if THUMBNAIL_FORMAT == "WEBP" else ".jpg"
+    return os.path.join(THUMBNAIL_DIR, str(size), folder, os.path.splitext(filename)[0] + ext)
+
+
+def _load_thumbnail_index():
+    # Bangun indeks dari isi cache di disk, diurutkan dari yang paling lama tidak dipakai
+    global _thumbnail_index
+    entries = []
+    for dirpath, _, filenames in os.walk(THUMBNAIL_DIR):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, path, stat.st_size))
+    entries.sort()
+    _thumbnail_index = OrderedDict((path, size) for _, path, size in entries)
+
+
+def _evict_thumbnails():
+    total = sum(_thumbnail_index.values())
+    while total > THUMBNAIL_CACHE_MAX_BYTES and _thumbnail_index:
+        path, size = _thumbnail_index.popitem(last=False)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+def get_thumbnail(folder, filename, size):
+    """Kembalikan path thumbnail (dibuat jika belum ada), atau None jika gambar asli tidak ada."""
+    source_path = os.path.join(STORAGE_DIR, folder, filename)
+    thumb_path = _thumbnail_path(folder, filename, size)
+
+    with _thumbnail_lock:
+        if _thumbnail_index is None:
+            _load_thumbnail_index()
+
+        if os.path.exists(thumb_path):
+            # Cache hit: tandai sebagai baru dipakai (mtime juga dipakai worker lain saat membangun indeks)
+            os.utime(thumb_path)
+            _thumbnail_index[thumb_path] = os.path.getsize(thumb_path)
+            _thumbnail_index.move_to_end(thumb_path)
+            return thumb_path
+
+    if not os.path.isfile(source_path):
+        return None
+
+    os.makedirs(os.path.dirname(thumb_path), exist_ok=True)
+    with Image.open(source_path) as img:
+        # draft() membuat decoder JPEG langsung menghasilkan skala kecil
+        img.draft("RGB", (size, size))
+        img = img.convert("RGB")
+        img.thumbnail((size, size))
+        tmp_path = f"{thumb_path}.{uuid.uuid4().hex}.tmp"
+        img.save(tmp_path, format=THUMBNAIL_FORMAT, quality=80)
+    os.replace(tmp_path, thumb_path)
+
+    with _thumbnail_lock:
+        _thumbnail_index[thumb_path] = os.path.getsize(thumb_path)
+        _thumbnail_index.move_to_end(thumb_path)
+        _evict_thumbnails()
+    return thumb_path
+
+
+def generate_folder_thumbnails(folder):
+    # Dijalankan di background setelah gambar dipindahkan ke Storage
+    folder_path = os.path.join(STORAGE_DIR, folder)
+    for filename in os.listdir(folder_path):
+        if not filename.lower().endswith(('.png', '.jpg', '.jpeg')):
+            continue
+        for size in THUMBNAIL_SIZES:
+            try:
+                get_thumbnail(folder, filename, size)
+            except Exception as e:
+                print(f"Gagal membuat thumbnail {folder}/{filename}: {e}")
+
+
+def remove_thumbnails(folder):
+    # Buang thumbnail milik folder Storage yang dihapus
+    with _thumbnail_lock:
+        for size in THUMBNAIL_SIZES:
+            thumb_folder = os.path.join(THUMBNAIL_DIR, str(size), folder)
+            if _thumbnail_index is not None:
+                for path in [p for p in _thumbnail_index if p.startswith(thumb_folder + os.sep)]:
+                    del _thumbnail_index[path]
+            shutil.rmtree(thumb_folder, ignore_errors=True)
+
+
+@app.route('/thumbnails/<int:size>/<path:filename>', methods=['GET'])
+def get_thumbnail_image(size, filename):
+    if size not in THUMBNAIL_SIZES:
+        return jsonify({"error": f"Ukuran thumbnail harus salah satu dari {THUMBNAIL_SIZES}"}), 400
+
+    folder, _, image_name = filename.rpartition("/")
+    if not folder or folder != os.path.basename(folder) or folder in (".", ".."):
+        return jsonify({"error": "Path tidak valid."}), 404
+
+    try:
+        thumb_path = get_thumbnail(folder, os.path.basename(image_name), size)
+    except Exception as e:
+        return jsonify({"error": f"Gagal membuat thumbnail: {e}"}), 500
+    if thumb_path is None:
+        return jsonify({"error": "Gambar tidak ditemukan."}), 404
+    return send_file(thumb_path, conditional=True, etag=True, max_age=IMAGE_CACHE_MAX_AGE)
+
+
 # Entry point for WSGI servers
 application = app
 
+# Durasi setiap request, Server-Timing, dan profil opsional satu request
+@app.before_request
+def _start_request_timer():
+    g.request_start = perf_counter()
+    mode = request.args.get("profile") if PROFILE_REQUESTS else None
+    if mode == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+            g.profiler = ("pyinstrument", Profiler())
+            g.profiler[1].start()
+        except ImportError:
+            g.profiler = None
+    elif mode:
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+            g.profiler = ("cprofile", profiler)
+        except ValueError:
+            # Sudah ada profiler lain yang aktif di proses ini
+            g.profiler = None
+
+
+@app.after_request
+def _finish_request_timer(response):
+    if "request_start" not in g:
+        return response
+    elapsed = perf_counter() - g.request_start
+    rule = request.url_rule.rule if request.url_rule else "unmatched"
+    observe("smartfarm_http_request_seconds", elapsed, endpoint=rule, method=request.method,
+            status=str(response.status_code))
+
+    profiler = g.pop("profiler", None)
+    if profiler:
+        kind, instance = profiler
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        name = f"{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}_{request.endpoint or 'unmatched'}_{uuid.uuid4().hex[:6]}"
+        if kind == "pyinstrument":
+            instance.stop()
+            path = os.path.join(PROFILE_DIR, f"{name}.html")
+            with open(path, "w") as f:
+                f.write(instance.output_html())
+        else:
+            instance.disable()
+            path = os.path.join(PROFILE_DIR, f"{name}.prof")
+            instance.dump_stats(path)
+        response.headers["X-Profile-File"] = os.path.relpath(path, ROOT_DIR)
+
+    if SERVER_TIMING or request.headers.get("X-Server-Timing") == "1":
+        entries = g.get("server_timing", {})
+        parts = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in entries.items()]
+        parts.append(f"total;dur={elapsed * 1000:.1f}")
+        response.headers["Server-Timing"] = ", ".join(parts)
+    return response
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    lines = render_metrics()
+    # Gauge sederhana untuk kedalaman antrian
+    for name, value, help_text in [
+        ("smartfarm_job_queue_depth", _job_queue.qsize(), "Job klasifikasi yang menunggu."),
+        ("smartfarm_pipeline_queue_depth", _pipeline_queue.qsize(), "Gambar yang menunggu di pipeline."),
+        ("smartfarm_result_cache_entries", len(_result_cache), "Entri cache hasil di proses ini."),
+        ("smartfarm_schema_current", int(_schema_state["status"] in ("current", "migrated")),
+         "1 jika skema database sesuai SCHEMA_VERSION saat init_db terakhir di proses ini."),
+    ]:
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {value}"]
+    return Response("\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4")
+
+
 if __name__ == '__main__':
+    init_db()
+    start_scheduler()
     app.run(port=5000, debug=True)
@@ -0,0 +1,66 @@
+"""Export Model/best.pt ke ONNX untuk INFERENCE_BACKEND=onnx, opsional dengan varian int8.
+
+    python export_onnx.py                 # Model/best.pt -> Model/best.onnx
+    python export_onnx.py --int8          # juga Model/best.int8.onnx (kuantisasi dinamis)
+
+Butuh paket onnx dan onnxruntime (tidak ada di requirements.txt karena backend ini opsional).
+Setelah export, set di .env:
+
+    INFERENCE_BACKEND=onnx
+    ONNX_MODEL_PATH=Model/best.onnx       # atau Model/best.int8.onnx
+    INFERENCE_THREADS=4
+"""
+import argparse
+import os
+import shutil
+
+from app import MODEL_PATH, ROOT_DIR, get_model_imgsz
+
+
+def export_fp32(model_path, output_path, imgsz):
+    from ultralytics import YOLO
+
+    model = YOLO(model_path)
+    imgsz = imgsz or get_model_imgsz(model)
+    # dynamic=True: ukuran batch bebas, sehingga satu batch /classify tetap satu kali run
+    exported = model.export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True)
+    if os.path.abspath(exported) != os.path.abspath(output_path):
+        shutil.move(exported, output_path)
+    return output_path
+
+
+def export_int8(fp32_path, output_path):
+    import onnx
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantize_dynamic(fp32_path, output_path, weight_type=QuantType.QUInt8)
+
+    # Kuantisasi tidak membawa metadata ultralytics (names, imgsz) yang dibaca OnnxClassifier
+    source = onnx.load(fp32_path, load_external_data=False)
+    quantized = onnx.load(output_path)
+    existing = {prop.key for prop in quantized.metadata_props}
+    for prop in source.metadata_props:
+        if prop.key not in existing:
+            quantized.metadata_props.add(key=prop.key, value=prop.value)
+    onnx.save(quantized, output_path)
+    return output_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=MODEL_PATH, help="bobot PyTorch sumber")
+    parser.add_argument("--output", default=os.path.join(ROOT_DIR, "Model", "best.onnx"))
+    parser.add_argument("--imgsz", type=int, default=None, help="default: imgsz saat training")
+    parser.add_argument("--int8", action="store_true", help="buat juga varian int8 (<output>.int8.onnx)")
+    args = parser.parse_args()
+
+    fp32_path = export_fp32(args.model, args.output, args.imgsz)
+    print(f"ONNX fp32: {fp32_path} ({os.path.getsize(fp32_path) / 1024 / 1024:.1f} MB)")
+
+    if args.int8:
+        int8_path = export_int8(fp32_path, os.path.splitext(fp32_path)[0] + ".int8.onnx")
+        print(f"ONNX int8: {int8_path} ({os.path.getsize(int8_path) / 1024 / 1024:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+"""Jalankan migrasi skema database sekali, sebagai langkah deploy (bukan saat worker Passenger start).
+
+    python migrate.py             # migrasi jika versi skema di database berbeda dengan SCHEMA_VERSION
+    python migrate.py --check     # hanya cek versi, exit 1 jika belum sesuai
+    python migrate.py --force     # jalankan ulang semua pengecekan DDL walaupun versinya sudah sama
+
+Migrasi memakai GET_LOCK MySQL yang sama dengan init_db di worker, jadi aman dijalankan saat worker
+masih hidup. Setelah migrasi lewat script ini, set MIGRATE_ON_START=0 di .env supaya worker yang
+start hanya mengecek versi.
+"""
+import argparse
+import sys
+
+from app import SCHEMA_VERSION, init_db
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--check", action="store_true", help="hanya cek versi skema")
+    parser.add_argument("--force", action="store_true", help="migrasi walaupun versi sudah sama")
+    parser.add_argument("--wait", type=int, default=600, help="detik menunggu lock migrasi proses lain")
+    args = parser.parse_args()
+
+    try:
+        status = init_db(migrate=not args.check, wait=args.wait, force=args.force)
+    except Exception as e:
+        print(f"Migrasi gagal: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(f"Skema {SCHEMA_VERSION}: {status}")
+    sys.exit(0 if status in ("current", "migrated") else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,32 @@
-import imp
 import os
 import sys
 
 
-sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Import biasa (imp.load_source sudah deprecated dan dihapus di Python 3.12). Model YOLO/torch tidak
+# ikut diimpor di sini, baru saat inferensi pertama, sehingga worker baru cepat siap.
+import app as wsgi  # noqa: E402
 
-wsgi = imp.load_source('wsgi', 'app.py')
 application = wsgi.application
 
+# Cek versi skema database saat worker start (satu query jika sudah sesuai). Migrasi sebaiknya lewat
+# `python migrate.py` saat deploy; dengan MIGRATE_ON_START=1 satu worker menjalankannya di bawah lock
+# tanpa membuat worker lain menunggu. Kegagalan ditulis ke stderr (log Passenger) dan terlihat di
+# /metrics sebagai smartfarm_schema_current 0.
+try:
+    wsgi.init_db(migrate=wsgi.MIGRATE_ON_START)
+except Exception as e:
+    print(f"init_db gagal, skema database tidak dicek: {e}", file=sys.stderr)
+
+# Scheduler di dalam proses menggantikan cron yang memanggil /check-schedule (set SCHEDULER_ENABLED=1)
+if wsgi.SCHEDULER_ENABLED:
+    wsgi.start_scheduler()
+
+# Muat model YOLO di awal worker (set PRELOAD_MODEL=1 di .env)
+if os.getenv('PRELOAD_MODEL', '0') == '1':
+    wsgi.preload_model()
+
 
 
 